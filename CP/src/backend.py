@@ -0,0 +1,51 @@
+# command line of the CP technology (see BACKENDS in main.py), minizinc is only imported once the arguments are parsed
+
+
+def add_arguments(parser):
+    parser.add_argument('--solver', type=str, help='CP solver (default: chuffed)', default='chuffed')
+    parser.add_argument('--heu', type=int, help='CP search heuristic (default: input_order, min)', default=0)
+    parser.add_argument('--restart', type=int, help='CP restart strategy (default: luby)', default=1)
+    parser.add_argument('-d', '--dual', dest="dual", action="store_true", help="add dual model", default=False)
+    parser.add_argument('--lns', action='store_true', help='improve the greedy layout with large neighbourhood search')
+    parser.add_argument('--lns-neighbourhood', type=str, help='LNS neighbourhood (default: mixed)', default='mixed')
+    parser.add_argument('--lns-size', type=float, help='LNS neighbourhood size, as a fraction (default: 0.3)',
+                        default=0.3)
+    parser.add_argument('--lns-sub-timeout', type=int, help='LNS sub-problem timeout (ms, default: 5000)',
+                        default=5000)
+    parser.add_argument('--lns-iterations', type=int, help='LNS iterations (default: until timeout)')
+    parser.add_argument('--lns-workers', type=int, help='LNS sub-problems solved in parallel (default: 1)',
+                        default=1)
+
+
+def get_params(args):
+    if args.solver not in ('gecode', 'chuffed'):
+        raise ValueError(f'wrong solver {args.solver}; supported ones are gecode and chuffed')
+    if args.heu not in (0, 1, 2):
+        raise ValueError(f'wrong search heuristic {args.heu}; supported ones are (0, 1, 2)')
+    if args.restart not in (0, 1, 2):
+        raise ValueError(f'wrong restart {args.restart}; supported ones are (0, 1, 2)')
+    params = {'solver': args.solver, 'search_heuristic': args.heu, 'restart_strategy': args.restart}
+    if not args.lns:
+        return dict(params, dual=args.dual)
+    from CP.src.lns import NEIGHBOURHOODS
+    if args.dual:
+        raise ValueError('the lns engine does not support the dual model')
+    if args.lns_neighbourhood != 'mixed' and args.lns_neighbourhood not in NEIGHBOURHOODS:
+        raise ValueError(f'wrong neighbourhood {args.lns_neighbourhood}; supported ones are mixed, '
+                         f'{", ".join(NEIGHBOURHOODS)}')
+    if not 0 < args.lns_size <= 1:
+        raise ValueError(f'wrong neighbourhood size {args.lns_size}; it must be in (0, 1]')
+    return dict(params, neighbourhood=args.lns_neighbourhood, size=args.lns_size, sub_timeout=args.lns_sub_timeout,
+                iterations=args.lns_iterations, workers=args.lns_workers)
+
+
+def get_solver(args):
+    if args.lns:
+        from CP.src.lns import solve_LNS
+        return solve_LNS
+    from CP.src.launch import solve_CP
+    return solve_CP
+
+
+def timings_suffix(args):
+    return f'-heu{args.heu}-restart{args.restart}{"-lns-" + args.lns_neighbourhood if args.lns else ""}'
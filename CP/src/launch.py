@@ -1,9 +1,33 @@
+import asyncio
 from minizinc import Instance, Model, Solver
-from minizinc.result import Status
+from minizinc.result import Result, Status
 from datetime import timedelta
+from utils.cache import consult, record
+from utils.deadline import Deadline, Phases
+from utils.search import checked, report_best
 
 
-def solve_CP(instance, dual, rotation, solver, search_heuristic, restart_strategy, timeout=300000):
+def get_layout(result, instance, rotation):
+    return {'l': result.objective, 'xhat': result['xhat'], 'yhat': result['yhat'],
+            'x': result['x'] if rotation else instance['inputx'],
+            'y': result['y'] if rotation else instance['inputy'],
+            'rotation': result['rotation'] if rotation else None}
+
+
+async def stream_solutions(mzn, instance, rotation, deadline, processes, callback):
+    # same as mzn.solve, but every intermediate solution is passed to callback as soon as minizinc prints it
+    status, solution, statistics = Status.UNKNOWN, None, {}
+    async for result in mzn.solutions(timeout=timedelta(milliseconds=deadline.remaining()), processes=processes,
+                                      intermediate_solutions=True):
+        status = result.status
+        statistics.update(result.statistics)
+        if result.solution is not None:
+            solution = result.solution
+            callback(dict(get_layout(result, instance, rotation), time=deadline.elapsed()))
+    return Result(status, solution, statistics)
+
+
+def build_instance(instance, dual, rotation, solver, search_heuristic, restart_strategy):
     mod = ''
     if rotation:
         mod = '-rot'
@@ -21,20 +45,49 @@ def solve_CP(instance, dual, rotation, solver, search_heuristic, restart_strateg
     else:
         mzn['x'] = instance['inputx']
         mzn['y'] = instance['inputy']
+    pairs = [(a, b) for group in instance.get('groups', []) for a, b in zip(group, group[1:])]
+    mzn['n_identical'] = len(pairs)
+    mzn['identical_a'] = [a + 1 for a, _ in pairs]
+    mzn['identical_b'] = [b + 1 for _, b in pairs]
+    # warm start on the circuits placed by the hint, if any
+    hint = instance.get('hint') or {'xhat': []}
+    hinted = [k for k, xhat in enumerate(hint['xhat']) if xhat is not None]
+    mzn['n_hints'] = len(hinted)
+    mzn['hinted'] = [k + 1 for k in hinted]
+    mzn['hint_xhat'] = [hint['xhat'][k] for k in hinted]
+    mzn['hint_yhat'] = [hint['yhat'][k] for k in hinted]
     mzn['minl'] = instance['minl']
     mzn['maxl'] = instance['maxl']
     mzn['search_heuristic'] = search_heuristic
     mzn['restart_strategy'] = restart_strategy
+    return mzn
+
+
+def solve_CP(instance, dual, rotation, solver, search_heuristic, restart_strategy, timeout=300000, cache=None,
+             callback=None):
+    if cache is not None and consult(instance, rotation, cache):
+        return instance
+    deadline = Deadline(timeout)
+    phases = Phases()
+    with phases('build'):
+        mzn = build_instance(instance, dual, rotation, solver, search_heuristic, restart_strategy)
 
     processes = -1 if solver == 'gecode' else None
-    result = mzn.solve(timeout=timedelta(milliseconds=timeout), processes=processes)
+    with phases('solve'):
+        if callback is None:
+            result = mzn.solve(timeout=timedelta(milliseconds=deadline.remaining()), processes=processes)
+        else:
+            result = asyncio.run(stream_solutions(mzn, instance, rotation, deadline, processes,
+                                                 checked(callback, instance, rotation)))
+    if isinstance(result.statistics.get('flatTime'), timedelta):
+        # minizinc runs as a whole, the time spent flattening the model is the setup
+        phases.move('solve', 'setup', result.statistics['flatTime'].total_seconds())
+    instance['phases'] = phases.times
     if result.status == Status.OPTIMAL_SOLUTION:
-        output = {'solved': True, 'l': result.objective, 'xhat': result['xhat'], 'yhat': result['yhat'],
-                  'x': result['x'] if rotation else instance['inputx'],
-                  'y': result['y'] if rotation else instance['inputy'],
-                  'fulltime': f'total: {result.statistics["time"]}',
-                  'time': (result.statistics['time'].microseconds / (10 ** 6)) + result.statistics['time'].seconds,
-                  'rotation': result['rotation'] if rotation else None}
+        with phases('decode'):
+            layout = get_layout(result, instance, rotation)
+        # wall-clock time like the other technologies, result.statistics['time'] leaves out the minizinc startup
+        output = dict(layout, solved=True, fulltime=str(phases), time=deadline.elapsed())
     else:
         output = {'solved': False}
     instance.update(output)
@@ -42,4 +95,9 @@ def solve_CP(instance, dual, rotation, solver, search_heuristic, restart_strateg
         print('SOLVED')
     else:
         print('NOT SOLVED WITHIN TIME LIMIT')
+        # the last solution printed before the timeout is the best one found
+        report_best(instance, get_layout(result, instance, rotation) if result.status == Status.SATISFIED else None,
+                    instance['minl'], rotation, deadline, str(phases))
+    if cache is not None:
+        record(instance, rotation, cache)
     return instance
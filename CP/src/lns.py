@@ -0,0 +1,122 @@
+import asyncio
+import numpy as np
+from datetime import timedelta
+from minizinc.result import Status
+from CP.src.launch import build_instance, get_layout
+from utils.cache import consult, record
+from utils.deadline import Deadline, Phases
+from utils.packer import greedy_pack
+from utils.search import checked, report_best
+
+
+# Large Neighbourhood Search on top of the CP model: starting from an incumbent layout, every circuit outside a
+# neighbourhood is fixed where it is and the sub-problem is solved with a short timeout under l < incumbent.
+# Each worker owns a minizinc instance and solves its sub-problems as branches of it, workers run concurrently.
+# Symmetry breaking constraints are ignored in the sub-problems, since the fixed circuits may not satisfy them.
+
+def band(layout, size, rng):
+    # circuits crossing a random horizontal band, size is the fraction of the length it covers
+    height = max(1, round(size * layout['l']))
+    y0 = int(rng.integers(0, max(layout['l'] - height, 0) + 1))
+    return {k for k, (yhat, y) in enumerate(zip(layout['yhat'], layout['y'])) if yhat < y0 + height and y0 < yhat + y}
+
+
+def subset(layout, size, rng):
+    # random circuits, size is the fraction of circuits freed
+    n = len(layout['x'])
+    return set(rng.choice(n, size=max(1, round(size * n)), replace=False).tolist())
+
+
+def top(layout, size, rng):
+    # circuits reaching the highest, ties broken randomly
+    n = len(layout['x'])
+    tops = np.array(layout['yhat']) + np.array(layout['y'])
+    return set(np.lexsort((rng.random(n), -tops))[:max(1, round(size * n))].tolist())
+
+
+NEIGHBOURHOODS = {'band': band, 'random': subset, 'top': top}
+
+
+def fix_layout(layout, free, l):
+    # minizinc code fixing the circuits outside free and bounding the length
+    lines = ['mzn_ignore_symmetry_breaking_constraints = true;', f'constraint l <= {l};']
+    lines += [f'constraint xhat[{k + 1}] = {xhat} /\\ yhat[{k + 1}] = {yhat} /\\ x[{k + 1}] = {x} /\\ y[{k + 1}] = {y};'
+              for k, (x, y, xhat, yhat) in enumerate(zip(layout['x'], layout['y'], layout['xhat'], layout['yhat']))
+              if k not in free]
+    return '\n'.join(lines)
+
+
+async def solve_neighbourhood(mzn, layout, free, l, timeout, processes):
+    with mzn.branch() as child:
+        child.add_string(fix_layout(layout, free, l))
+        return await child.solve_async(timeout=timedelta(milliseconds=timeout), processes=processes)
+
+
+async def solve_neighbourhoods(workers, layout, frees, l, timeout, processes):
+    return await asyncio.gather(*[solve_neighbourhood(mzn, layout, free, l, timeout, processes)
+                                  for mzn, free in zip(workers, frees)])
+
+
+def solve_LNS(instance, rotation, solver, search_heuristic, restart_strategy, timeout=300000, cache=None,
+              callback=None, neighbourhood='mixed', size=0.3, sub_timeout=5000, iterations=None, workers=1, seed=None):
+    if neighbourhood != 'mixed' and neighbourhood not in NEIGHBOURHOODS:
+        raise ValueError(f'wrong neighbourhood {neighbourhood}; supported ones are mixed, {", ".join(NEIGHBOURHOODS)}')
+    print(f'W = {instance["w"]}, N = {instance["n"]}')
+    if cache is not None and consult(instance, rotation, cache):
+        return instance
+    deadline = Deadline(timeout)
+    phases = Phases()
+    callback = checked(callback, instance, rotation)
+    incumbent = instance.get('heuristic') or greedy_pack(instance['w'], instance['inputx'], instance['inputy'], rotation)
+    lower_bound = instance['minl']
+    rng = np.random.default_rng(seed)
+    with phases('build'):
+        models = [build_instance(instance, False, rotation, solver, search_heuristic, restart_strategy)
+                  for _ in range(workers)]
+    processes = -1 if solver == 'gecode' and workers == 1 else None
+    names = list(NEIGHBOURHOODS) if neighbourhood == 'mixed' else [neighbourhood]
+    current_size = size
+
+    iteration = 0
+    while incumbent['l'] > lower_bound and not deadline.expired() and (iterations is None or iteration < iterations):
+        l = incumbent['l'] - 1
+        # circuits above the new length have to move anyway
+        above = {k for k, (yhat, y) in enumerate(zip(incumbent['yhat'], incumbent['y'])) if yhat + y > l}
+        frees = [NEIGHBOURHOODS[names[(iteration * workers + k) % len(names)]](incumbent, current_size, rng) | above
+                 for k in range(workers)]
+        with phases('solve'):
+            results = asyncio.run(solve_neighbourhoods(models, incumbent, frees, l,
+                                                       min(sub_timeout, deadline.remaining()), processes))
+        iteration += 1
+        improved = [result for result in results if result.status in (Status.SATISFIED, Status.OPTIMAL_SOLUTION)]
+        if improved:
+            with phases('decode'):
+                incumbent = dict(get_layout(min(improved, key=lambda result: result.objective), instance, rotation),
+                                 time=deadline.elapsed())
+            print(f'LNS IMPROVED L = {incumbent["l"]}')
+            if callback is not None:
+                callback(incumbent)
+            current_size = size
+        elif any(result.status == Status.UNSATISFIABLE and len(free) == instance['n']
+                 for result, free in zip(results, frees)):
+            # the neighbourhood was the whole plate, so no layout is lower than the incumbent
+            lower_bound = incumbent['l']
+        else:
+            # no improvement, larger neighbourhoods next time
+            current_size = min(1., current_size * 1.5)
+
+    instance['iterations'] = iteration
+    instance['phases'] = phases.times
+    if incumbent['l'] <= lower_bound:
+        print('FOUND OPTIMAL SOLUTION')
+        instance.update(incumbent)
+        instance['solved'] = True
+        instance['time'] = deadline.elapsed()
+        instance['fulltime'] = f'lns: {iteration} iterations, {phases}'
+    else:
+        print('NOT SOLVED WITHIN TIME LIMIT')
+        instance['solved'] = False
+        report_best(instance, incumbent, lower_bound, rotation, deadline, f'lns: {iteration} iterations, {phases}')
+    if cache is not None:
+        record(instance, rotation, cache)
+    return instance
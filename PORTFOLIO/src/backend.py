@@ -0,0 +1,22 @@
+# command line of the portfolio, imported by main.py only when PORTFOLIO is selected. Each configuration imports
+# its own solver in its own process
+
+
+def add_arguments(parser):
+    parser.add_argument('--heu', type=int, help='CP search heuristic (default: input_order, min)', default=0)
+    parser.add_argument('--restart', type=int, help='CP restart strategy (default: luby)', default=1)
+
+
+def get_params(args):
+    if args.anytime:
+        raise ValueError('the anytime mode is not supported by the portfolio')
+    return {'search_heuristic': args.heu, 'restart_strategy': args.restart}
+
+
+def get_solver(args):
+    from PORTFOLIO.src.launch import solve_PORTFOLIO
+    return solve_PORTFOLIO
+
+
+def timings_suffix(args):
+    return ''
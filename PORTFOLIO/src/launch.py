@@ -0,0 +1,107 @@
+import os
+import signal
+from multiprocessing import Process, Queue
+from queue import Empty
+from utils.deadline import Deadline
+from utils.search import report_best
+
+
+def get_configurations(rotation, search_heuristic=0, restart_strategy=1):
+    # (name, technology, parameters) of the configurations raced on each instance
+    cp = {'dual': False, 'rotation': rotation, 'search_heuristic': search_heuristic,
+          'restart_strategy': restart_strategy}
+    return [('CP-chuffed', 'CP', dict(cp, solver='chuffed')),
+            ('CP-gecode', 'CP', dict(cp, solver='gecode')),
+            ('SAT', 'SAT', {'rotation': rotation, 'incremental': True, 'encoding': 'seq'}),
+            ('SMT', 'SMT', {'dual': False, 'rotation': rotation, 'kind': 'base'})]
+
+
+def run_configuration(queue, name, technology, params, instance, timeout):
+    # every configuration gets its own process group, so that the solver subprocesses it spawns
+    # (e.g. the minizinc executable) are terminated together with it
+    os.setpgrp()
+
+    def report(layout):
+        # improving layouts are sent as they are found: if no configuration proves the optimum, the best one is
+        # the answer, even if its configuration is still running at the timeout
+        queue.put((name, 'layout', layout))
+
+    try:
+        if technology == 'CP':
+            from CP.src.launch import solve_CP as solver
+        elif technology == 'SAT':
+            from SAT.src.launch import solve_SAT as solver
+        else:
+            from SMT.src.launch import solve_SMT as solver
+        queue.put((name, 'result', solver(instance, timeout=timeout, callback=report, **params)))
+    except Exception as e:
+        print(f'{name} FAILED: {e!r}')
+        queue.put((name, 'result', None))
+
+
+def stop(process):
+    # terminates the process group of a configuration, or the configuration alone if it has not created it yet
+    if process.pid is None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        process.terminate()
+    process.join()
+
+
+def solve_PORTFOLIO(instance, rotation, configurations=None, search_heuristic=0, restart_strategy=1,
+                    timeout=300000, cache=None):
+    # runs the configurations concurrently on the same instance, the first proven optimum wins
+    if configurations is None:
+        configurations = get_configurations(rotation, search_heuristic, restart_strategy)
+    if cache is not None:
+        configurations = [(name, technology, dict(params, cache=cache)) for name, technology, params in configurations]
+    print(f'W = {instance["w"]}, N = {instance["n"]}')
+    deadline = Deadline(timeout)
+    queue = Queue()
+    processes = {name: Process(target=run_configuration,
+                               args=(queue, name, technology, params, dict(instance), deadline.remaining()))
+                 for name, technology, params in configurations}
+
+    winner, result = None, None
+    best, lower_bound = None, instance['minl']
+    pending = set(processes)
+    # the process groups are terminated however the race ends (Ctrl-C included), as they are out of reach of
+    # the signals sent to the group of the terminal
+    try:
+        for p in processes.values():
+            p.start()
+        while pending and not deadline.expired():
+            try:
+                name, kind, message = queue.get(timeout=deadline.remaining() / 1000)
+            except Empty:
+                break
+            if kind == 'layout':
+                if best is None or message['l'] < best['l']:
+                    best = message
+                continue
+            pending.discard(name)
+            if message is None:
+                continue
+            if message['solved']:
+                winner, result = name, message
+                break
+            # a configuration which timed out: its best layout and lower bound still count
+            if message.get('heuristic') is not None and (best is None or message['heuristic']['l'] < best['l']):
+                best = message['heuristic']
+            lower_bound = max(lower_bound, message.get('lower_bound', message['minl']))
+    finally:
+        for p in processes.values():
+            stop(p)
+
+    instance['winner'] = winner
+    if winner is not None:
+        print(f'WINNER: {winner}')
+        instance.update(result)
+        instance['fulltime'] = f'{winner}, {result["fulltime"]}'
+    else:
+        print('NOT SOLVED WITHIN TIME LIMIT')
+        instance['solved'] = False
+        report_best(instance, best, lower_bound, rotation, deadline, 'portfolio, best layout of the configurations')
+    return instance
@@ -0,0 +1,51 @@
+from utils.search import STRATEGIES
+
+# command line of the SAT technology (see BACKENDS in main.py), z3 is only imported once the arguments are parsed
+
+
+def add_arguments(parser):
+    parser.add_argument('--sat-search', action="store_true", help="enables custom z3 sat search")
+    parser.add_argument('--sat-incremental', action="store_true",
+                        help="encodes the board once and reuses the same solver for every length")
+    parser.add_argument('--sat-encoding', type=str, help='SAT at most one encoding (default: pairwise)',
+                        default='pairwise')
+    parser.add_argument('--sat-model', type=str, help='SAT model to use (default: base)', default='base')
+    parser.add_argument('--sat-backend', type=str, help='SAT model backend, z3 expressions or DIMACS CNF '
+                                                        '(default: z3)', default='z3')
+    parser.add_argument('--sat-binary', type=str, help='external SAT solver used by the dimacs backend '
+                                                       '(default: z3)')
+    parser.add_argument('--search', type=str, help='length search strategy (default: linear-up)',
+                        default='linear-up')
+
+
+def get_params(args):
+    from SAT.src.base_model import ENCODINGS
+    if args.search not in STRATEGIES:
+        raise ValueError(f'wrong search strategy {args.search}; supported ones are {", ".join(STRATEGIES)}')
+    if args.sat_encoding not in ENCODINGS:
+        raise ValueError(f'wrong encoding {args.sat_encoding}; supported ones are {", ".join(ENCODINGS)}')
+    if args.sat_model not in ('base', 'order'):
+        raise ValueError(f'wrong sat model {args.sat_model}; supported ones are "base", "order"')
+    if args.sat_backend not in ('z3', 'dimacs'):
+        raise ValueError(f'wrong backend {args.sat_backend}; supported ones are z3, dimacs')
+    if args.sat_backend == 'dimacs' and args.sat_model != 'base':
+        raise ValueError('the dimacs backend only supports the base sat model')
+    if args.sat_backend == 'dimacs' and args.sat_encoding not in ('pairwise', 'seq'):
+        raise ValueError(f'wrong encoding {args.sat_encoding}; the dimacs backend supports pairwise, seq')
+    return {'custom_search': args.sat_search, 'incremental': args.sat_incremental, 'search': args.search,
+            'encoding': args.sat_encoding, 'backend': args.sat_backend, 'sat_binary': args.sat_binary,
+            'kind': args.sat_model}
+
+
+def get_solver(args):
+    from SAT.src.launch import solve_SAT
+    return solve_SAT
+
+
+def timings_suffix(args):
+    return f'{"-search" if args.sat_search else ""}' \
+           f'{"-inc" if args.sat_incremental else ""}' \
+           f'{"-" + args.sat_encoding if args.sat_encoding != "pairwise" else ""}' \
+           f'{"-dimacs" if args.sat_backend == "dimacs" else ""}' \
+           f'{"-" + args.sat_model if args.sat_model != "base" else ""}' \
+           f'{"-" + args.search if args.search != "linear-up" else ""}'
@@ -1,6 +1,5 @@
-from itertools import combinations
+from math import ceil, log2
 from z3 import *
-import numpy as np
 
 
 def lex_lesseq(x, y):
@@ -19,19 +18,81 @@ def at_least_one(vs):
     return Or(vs)
 
 
-def at_most_one(vs):
-    return And([Not(And(pair[0], pair[1])) for pair in combinations(vs, 2)])
+def at_most_one_pairwise(vs, name, deadline=None):
+    # quadratic in the number of literals, the deadline (if any) is checked while the pairs are built
+    constraints = []
+    for k in range(len(vs)):
+        if deadline is not None:
+            deadline.check()
+        constraints += [Not(And(vs[k], v)) for v in vs[k + 1:]]
+    return And(constraints)
+
+
+def at_most_one_seq(vs, name):
+    # sequential counter (Sinz, 2005): s_i is true if one of the first i + 1 literals is true
+    if len(vs) < 2:
+        return BoolVal(True)
+    s = [Bool(f'{name}_s_{i}') for i in range(len(vs) - 1)]
+    return And([Implies(vs[0], s[0])] +
+               [Implies(vs[i], s[i]) for i in range(1, len(vs) - 1)] +
+               [Implies(s[i - 1], s[i]) for i in range(1, len(vs) - 1)] +
+               [Implies(vs[i], Not(s[i - 1])) for i in range(1, len(vs))])
+
+
+def at_most_one_commander(vs, name, group_size=3):
+    # commander encoding (Klieber and Kwon, 2007): pairwise inside small groups, each group selects a commander
+    # variable and at most one commander is true, recursively
+    if len(vs) <= group_size + 1:
+        return at_most_one_pairwise(vs, name)
+    groups = [vs[i:i + group_size] for i in range(0, len(vs), group_size)]
+    commanders = [Bool(f'{name}_c_{g}') for g in range(len(groups))]
+    return And([at_most_one_pairwise(group, name) for group in groups] +
+               [Implies(v, c) for group, c in zip(groups, commanders) for v in group] +
+               [at_most_one_commander(commanders, f'{name}_c', group_size)])
+
+
+def at_most_one_bimander(vs, name):
+    # bimander encoding (Nguyen and Mai, 2015): pairwise inside sqrt(k) groups, groups identified by a binary code
+    if len(vs) < 4:
+        return at_most_one_pairwise(vs, name)
+    n_groups = ceil(len(vs) ** 0.5)
+    group_size = ceil(len(vs) / n_groups)
+    groups = [vs[i:i + group_size] for i in range(0, len(vs), group_size)]
+    bits = [Bool(f'{name}_b_{b}') for b in range(ceil(log2(len(groups))))]
+    return And([at_most_one_pairwise(group, name) for group in groups] +
+               [Implies(v, bit if (g >> b) & 1 else Not(bit))
+                for g, group in enumerate(groups) for v in group for b, bit in enumerate(bits)])
+
 
+def at_most_one_pb(vs, name):
+    return AtMost(*vs, 1)
 
-def exactly_one(vs):
-    return And(at_least_one(vs), at_most_one(vs))
+
+ENCODINGS = {'pairwise': at_most_one_pairwise, 'seq': at_most_one_seq, 'commander': at_most_one_commander,
+             'bimander': at_most_one_bimander, 'pb': at_most_one_pb}
+
+
+def at_most_one(vs, encoding='pairwise', name='', deadline=None):
+    # name is used as prefix for the auxiliary variables introduced by the encoding
+    if encoding == 'pairwise':
+        return at_most_one_pairwise(vs, name, deadline)
+    return ENCODINGS[encoding](vs, name)
+
+
+def exactly_one(vs, encoding='pairwise', name='', deadline=None):
+    if encoding == 'pb':
+        return PbEq([(v, 1) for v in vs], 1)
+    return And(at_least_one(vs), at_most_one(vs, encoding, name, deadline))
 
 
 def equal_counts(a, b):
     return And([Not(Xor(ai, bi)) for ai, bi in zip(a, b)])
 
 
-def base_model(instance, l, rotation):
+def base_model(instance, l, rotation, incremental=False, encoding='pairwise', deadline=None):
+    # with incremental=True the board is built once with l = maxl rows and each row gets an activation literal,
+    # so that the candidate length can be changed through assumptions (see length_assumptions).
+    # Building the model of a large instance takes minutes: with a deadline, Expired is raised once it is over
     constraints = []
     vs = {}
     circuits = list(range(instance['n']))
@@ -57,48 +118,64 @@ def base_model(instance, l, rotation):
     #                                        lex_lesseq(yproj[c1], yproj[c2])))
 
     # no overlap constraint
-    constraints += [exactly_one(board[i][j]) for j in range(w) for i in range(l)]
-
+    if incremental:
+        rows = [Bool(f'R_{i}') for i in range(l)]
+        vs['R'] = rows
+        # active rows are contiguous from the bottom of the plate
+        constraints += [Implies(rows[i + 1], rows[i]) for i in range(l - 1)]
+        # cells of active rows are covered by exactly one circuit, cells of inactive rows are empty
+        constraints += [at_most_one(board[i][j], encoding, f'cell_{i}_{j}') for j in range(w) for i in range(l)]
+        constraints += [Implies(rows[i], at_least_one(board[i][j])) for j in range(w) for i in range(l)]
+        constraints += [Implies(Not(rows[i]), Not(Or([board[i][j][k] for j in range(w) for k in circuits])))
+                        for i in range(l)]
+    else:
+        constraints += [exactly_one(board[i][j], encoding, f'cell_{i}_{j}') for j in range(w) for i in range(l)]
+
+    # placements of each circuit as (literal, xhat, yhat, x, y): the layout is read from the chosen placements, as
+    # above the optimal length the cells left over by them are assigned to arbitrary circuits
+    vs['locations'] = []
     for c, x, y in zip(circuits, instance['inputx'], instance['inputy']):
-        possible_locations = []
-        for xhat in range(w - x + 1):
-            for yhat in range(l - y + 1):
-                possible_locations.append(And([board[i][j][c]
-                                               for i in range(yhat, yhat + y)
-                                               for j in range(xhat, xhat + x)]))
-        if rotation and x != y:
-            for xhat in range(w - y + 1):
-                for yhat in range(l - x + 1):
-                    possible_locations.append(And([board[i][j][c]
-                                                   for i in range(yhat, yhat + x)
-                                                   for j in range(xhat, xhat + y)]))
+        if deadline is not None:
+            deadline.check()
+        shapes = [(x, y)] + ([(y, x)] if rotation and x != y else [])
+        possible_locations = [(And([board[i][j][c] for i in range(yhat, yhat + cy) for j in range(xhat, xhat + cx)]),
+                               xhat, yhat, cx, cy)
+                              for cx, cy in shapes for xhat in range(w - cx + 1) for yhat in range(l - cy + 1)]
+        vs['locations'].append(possible_locations)
         # each circuit is placed in exactly one location
-        constraints.append(exactly_one(possible_locations))
+        constraints.append(exactly_one([location for location, *_ in possible_locations], encoding, f'loc_{c}',
+                                       deadline))
 
     # symmetry breaking constraints
     slice0 = [board[i][j][0] for j in range(w) for i in range(l)]
     slice1 = [board[i][j][1] for j in range(w) for i in range(l)]
     constraints.append(lex_lesseq(slice0, slice1))
+    # identical circuits symmetry: the copy with the lowest index comes first in the order used above; circuit 0 is
+    # left out, as the constraint above puts it after circuit 1
+    for group in instance.get('groups', []):
+        group = [k for k in group if k != 0]
+        for a, b in zip(group, group[1:]):
+            constraints.append(lex_lesseq([board[i][j][b] for j in range(w) for i in range(l)],
+                                          [board[i][j][a] for j in range(w) for i in range(l)]))
 
     return constraints, vs
 
 
-def get_solution(B, model, instance, rotation):
-    board = np.array([[[is_true(model[B[i][j][k]])
-                        for k in range(instance['n'])]
-                       for j in range(instance['w'])]
-                      for i in range(instance['l'])])
-    xs, ys = [], []
-    xhats, yhats = [], []
+def length_assumptions(vs, l):
+    # assumptions restricting an incremental model to the first l rows
+    return [row if i < l else Not(row) for i, row in enumerate(vs['R'])]
+
+
+def get_solution(model, vs, instance, rotation):
+    xs, ys, xhats, yhats = [], [], [], []
     rotations = [] if rotation else None
-    for k in range(instance['n']):
-        yhat, xhat = np.unravel_index(board[:, :, k].argmax(), board[:, :, 0].shape)
-        y = board[:, xhat, k].sum()
-        x = board[yhat, :, k].sum()
+    for k, possible_locations in enumerate(vs['locations']):
+        xhat, yhat, x, y = next((xhat, yhat, x, y) for location, xhat, yhat, x, y in possible_locations
+                                if is_true(model.eval(location, model_completion=True)))
         xhats.append(xhat)
         yhats.append(yhat)
         xs.append(x)
         ys.append(y)
         if rotation:
-            rotations.append(False if (x, y) == (instance['inputx'][k], instance['inputy'][k]) else True)
+            rotations.append((x, y) != (instance['inputx'][k], instance['inputy'][k]))
     return xs, ys, xhats, yhats, rotations
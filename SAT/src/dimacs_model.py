@@ -0,0 +1,118 @@
+import io
+import numpy as np
+
+
+# CNF version of base_model built directly as integer clauses: every circuit gets one variable per possible
+# placement, every (row, column, circuit) cell gets one variable, and variable ids are computed with NumPy
+# index arithmetic instead of building z3 expressions.
+# Placements imply the cells they cover and each cell is covered by at most one circuit, so a model is a
+# layout fitting in l rows.
+
+def cell_ids(l, w, n):
+    return 1 + np.arange(l * w * n).reshape(l, w, n)
+
+
+def amo_clauses(groups, next_id, encoding):
+    # at most one true literal in each row of groups (a 2D array of variable ids), returns the clause
+    # arrays and the first free variable id
+    m = groups.shape[1]
+    if m < 2:
+        return [], next_id
+    if encoding == 'pairwise':
+        i, j = np.triu_indices(m, 1)
+        return [np.stack([-groups[:, i], -groups[:, j]], axis=-1).reshape(-1, 2)], next_id
+    if encoding == 'seq':
+        # sequential counter (Sinz, 2005), see base_model.at_most_one_seq
+        s = next_id + np.arange(groups.shape[0] * (m - 1)).reshape(groups.shape[0], m - 1)
+        clauses = [np.stack([-groups[:, :-1], s], axis=-1).reshape(-1, 2),
+                   np.stack([-s[:, :-1], s[:, 1:]], axis=-1).reshape(-1, 2),
+                   np.stack([-groups[:, 1:], -s], axis=-1).reshape(-1, 2)]
+        return clauses, next_id + s.size
+    raise ValueError(f'wrong encoding {encoding} for the dimacs model; supported ones are pairwise, seq')
+
+
+def dimacs_lines(c):
+    # one '<literals> 0' line per row of the clause array c, formatted in a single pass
+    rows = np.hstack([c, np.zeros((len(c), 1), dtype=c.dtype)])
+    return (('%d ' * c.shape[1] + '%d\n') * len(rows)) % tuple(rows.ravel().tolist())
+
+
+def placements(w, l, x, y, rotation):
+    # (xhat, yhat, width, height) of every position of a circuit in a w x l plate
+    shapes = [(x, y)] + ([(y, x)] if rotation and x != y else [])
+    out = []
+    for cx, cy in shapes:
+        if cx <= w and cy <= l:
+            xhat, yhat = np.meshgrid(np.arange(w - cx + 1), np.arange(l - cy + 1), indexing='ij')
+            out.append(np.stack([xhat.ravel(), yhat.ravel(), np.full(xhat.size, cx), np.full(xhat.size, cy)],
+                                axis=1))
+    return np.concatenate(out) if out else np.zeros((0, 4), dtype=int)
+
+
+def dimacs_model(instance, l, rotation, encoding='pairwise', out=None, deadline=None):
+    # writes the CNF in DIMACS format to out (a text file object, a string buffer by default)
+    # and returns it together with the variable layout needed by get_solution. With a deadline, Expired is raised
+    # once it is over
+    w, n = instance['w'], instance['n']
+    cells = cell_ids(l, w, n)
+    next_id = cells.size + 1
+    clauses = []
+    vs = {'locations': []}
+
+    if sum(x * y for x, y in zip(instance['inputx'], instance['inputy'])) > w * l:
+        # area bound, as in order_model
+        clauses.append(np.zeros((1, 0), dtype=int))
+
+    # no overlap: each cell is covered by at most one circuit
+    cell_clauses, next_id = amo_clauses(cells.reshape(-1, n), next_id, encoding)
+    clauses += cell_clauses
+
+    for c, x, y in zip(range(n), instance['inputx'], instance['inputy']):
+        if deadline is not None:
+            deadline.check()
+        pos = placements(w, l, x, y, rotation)
+        ids = next_id + np.arange(len(pos))
+        next_id += len(pos)
+        vs['locations'].append((int(ids[0]) if len(pos) else next_id, pos))
+        if not len(pos):
+            clauses.append(np.zeros((1, 0), dtype=int))  # the circuit does not fit: empty clause
+            continue
+        # each circuit is placed in exactly one location; a circuit can have thousands of placements, so the
+        # at most one is always the linear seq encoding, encoding only applies to cells
+        clauses.append(ids[None, :])
+        location_clauses, next_id = amo_clauses(ids[None, :], next_id, 'seq')
+        clauses += location_clauses
+        # a placement covers all of its cells
+        for cx, cy in np.unique(pos[:, 2:], axis=0):
+            sel = np.flatnonzero((pos[:, 2] == cx) & (pos[:, 3] == cy))
+            dx, dy = np.meshgrid(np.arange(cx), np.arange(cy), indexing='ij')
+            rows = pos[sel, 1][:, None] + dy.ravel()[None, :]
+            cols = pos[sel, 0][:, None] + dx.ravel()[None, :]
+            covered = cells[rows, cols, c]
+            clauses.append(np.stack([np.repeat(-ids[sel], cx * cy), covered.ravel()], axis=-1))
+
+    vs['n_vars'] = next_id - 1
+    out = io.StringIO() if out is None else out
+    out.write(f'p cnf {vs["n_vars"]} {sum(len(c) for c in clauses)}\n')
+    lines = []
+    for c in clauses:
+        if deadline is not None:
+            deadline.check()
+        lines.append(dimacs_lines(c))
+    out.write(''.join(lines))
+    return out, vs
+
+
+def get_solution(bits, vs, instance, rotation):
+    # bits is a flat boolean array indexed by DIMACS variable id
+    xs, ys, xhats, yhats = [], [], [], []
+    rotations = [] if rotation else None
+    for k, (first, pos) in enumerate(vs['locations']):
+        xhat, yhat, x, y = pos[np.argmax(bits[first:first + len(pos)])]
+        xhats.append(int(xhat))
+        yhats.append(int(yhat))
+        xs.append(int(x))
+        ys.append(int(y))
+        if rotation:
+            rotations.append((x, y) != (instance['inputx'][k], instance['inputy'][k]))
+    return xs, ys, xhats, yhats, rotations
@@ -1,6 +1,12 @@
-from time import time
-from z3 import Solver
-from SAT.src.base_model import base_model, get_solution
+import subprocess
+from tempfile import NamedTemporaryFile
+import numpy as np
+from z3 import Solver, is_true
+from SAT.src.base_model import base_model, get_solution, length_assumptions
+from SAT.src import dimacs_model, order_model
+from utils.cache import consult, record
+from utils.deadline import Deadline, Expired, Phases
+from utils.search import checked, report_best, search_length
 
 
 def get_solver(custom_search):
@@ -14,39 +20,155 @@ def get_solver(custom_search):
     return s
 
 
-def solve_SAT(instance, rotation, custom_search=False, timeout=300000):
+def solve_dimacs(cnf, n_vars, deadline, custom_search=False, sat_binary=None):
+    # solves a DIMACS CNF either with z3 or with an external solver following the SAT competition output format,
+    # returns the status and the assignment as a flat boolean array indexed by variable id. Parsing a large CNF
+    # takes long and is not covered by the z3 timeout, so the deadline is checked (Expired) before it
+    bits = np.zeros(n_vars + 1, dtype=bool)
+    if sat_binary is None:
+        deadline.check()
+        s = get_solver(custom_search)
+        s.from_string(cnf)
+        deadline.check()
+        s.set(timeout=deadline.remaining())
+        status = str(s.check())
+        if status == 'sat':
+            # z3 names DIMACS variables k!<id>
+            model = s.model()
+            bits[[int(d.name()[2:]) for d in model.decls() if is_true(model[d])]] = True
+        return status, bits
+
+    with NamedTemporaryFile('w', suffix='.cnf') as f:
+        f.write(cnf)
+        f.flush()
+        deadline.check()
+        try:
+            result = subprocess.run([sat_binary, f.name], capture_output=True, text=True,
+                                    timeout=deadline.remaining() / 1000)
+        except subprocess.TimeoutExpired:
+            return 'unknown', bits
+    lines = result.stdout.splitlines()
+    if 's SATISFIABLE' in lines:
+        literals = np.array([int(v) for line in lines if line.startswith('v ') for v in line.split()[1:]], dtype=int)
+        bits[literals[literals > 0]] = True
+        return 'sat', bits
+    return 'unsat' if 's UNSATISFIABLE' in lines else 'unknown', bits
+
+
+def build_model(instance, l, rotation, incremental, encoding, kind, deadline=None):
+    if kind == 'order':
+        return order_model.order_model(instance, l, rotation, incremental, deadline)
+    return base_model(instance, l, rotation, incremental, encoding, deadline)
+
+
+def decode(instance, l, vs, model, rotation, kind):
+    # returns the height of the layout and the layout itself
+    if kind == 'order':
+        xs, ys, xhats, yhats, rotations = order_model.get_solution(model, vs, instance, rotation)
+    else:
+        xs, ys, xhats, yhats, rotations = get_solution(model, vs, instance, rotation)
+    # the layout may be lower than l: in the order model the plate does not need to be fully covered, in the
+    # board model the placements may leave cells to spare
+    height = max(yhat + y for yhat, y in zip(yhats, ys))
+    return height, {'x': xs, 'y': ys, 'xhat': xhats, 'yhat': yhats, 'rotation': rotations}
+
+
+def solve_SAT(instance, rotation, custom_search=False, incremental=False, search='linear-up', encoding='pairwise',
+              backend='z3', sat_binary=None, kind='base', timeout=300000, cache=None, callback=None):
     print(f'W = {instance["w"]}, N = {instance["n"]}')
+    if kind not in ('base', 'order'):
+        raise ValueError(f'wrong model {kind}; supported ones are base, order')
+    if backend not in ('z3', 'dimacs'):
+        raise ValueError(f'wrong backend {backend}; supported ones are z3, dimacs')
+    if backend == 'dimacs' and kind != 'base':
+        raise ValueError('the dimacs backend only supports the base model')
+    if backend == 'dimacs' and incremental:
+        raise ValueError('the dimacs backend does not support incremental solving')
+    if cache is not None and consult(instance, rotation, cache):
+        return instance
     instance['solved'] = False
-    start_time = time()
-    elapsed_time = 0
-
-    for l in range(instance['minl'], instance['maxl'] + 1):
-        sol = get_solver(custom_search)
-        constraints, vs = base_model(instance, l, rotation)
-        setup_time = time() - start_time
-        elapsed_time += setup_time
-        sol.set(timeout=timeout - int(elapsed_time * 1000))
-        sol.add(constraints)
-        status = str(sol.check())
-        solve_time = time() - start_time + setup_time
-        elapsed_time += solve_time
+    deadline = Deadline(timeout)
+    phases = Phases()
 
-        if status == 'sat':
-            print('FOUND OPTIMAL SOLUTION')
-            instance['solved'] = True
-            instance['l'] = l
-            xs, ys, xhats, yhats, rotations = get_solution(vs['B'], sol.model(), instance, rotation)
-            instance['x'] = xs
-            instance['y'] = ys
-            instance['xhat'] = xhats
-            instance['yhat'] = yhats
-            instance['rotation'] = rotations
-            instance['fulltime'] = f'setup: {setup_time:.2f} s, solve: {solve_time:.2f} s'
-            instance['time'] = setup_time + solve_time
-            return instance
-        elif status == 'unsat':
-            print(f'UNSAT WITH L = {l}')
+    # building and setting up a model draws from the same deadline as solving it, a model which is still being built
+    # when the deadline expires is a timeout
+    sol = None
+    if incremental:
+        # the model is encoded once at maxl, then each candidate length is checked under assumptions
+        # so that learned clauses are kept between one length and the next
+        try:
+            with phases('build'):
+                constraints, vs = build_model(instance, instance['maxl'], rotation, True, encoding, kind, deadline)
+            with phases('setup'):
+                sol = get_solver(custom_search)
+                sol.add(constraints)
+        except Expired:
+            print('TIMEOUT WHILE BUILDING THE MODEL')
+
+    def probe(l, deadline):
+        if incremental:
+            if sol is None:
+                return 'unknown', None, None
+            sol.set(timeout=deadline.remaining())
+            with phases('solve'):
+                status = str(sol.check(*length_assumptions(vs, l)))
+            model, variables = (sol.model(), vs) if status == 'sat' else (None, None)
+        elif backend == 'dimacs':
+            try:
+                with phases('build'):
+                    cnf, variables = dimacs_model.dimacs_model(instance, l, rotation, encoding, deadline=deadline)
+                with phases('solve'):
+                    status, bits = solve_dimacs(cnf.getvalue(), variables['n_vars'], deadline, custom_search,
+                                                sat_binary)
+            except Expired:
+                print(f'TIMEOUT BEFORE SOLVING THE CNF WITH L = {l}')
+                return 'unknown', None, None
+            if status != 'sat':
+                return status, None, None
+            with phases('decode'):
+                xs, ys, xhats, yhats, rotations = dimacs_model.get_solution(bits, variables, instance, rotation)
+            # as in decode, the layout may be lower than l
+            height = max(yhat + y for yhat, y in zip(yhats, ys))
+            return status, height, {'x': xs, 'y': ys, 'xhat': xhats, 'yhat': yhats, 'rotation': rotations}
         else:
-            print('TIMEOUT')
-            break
+            try:
+                with phases('build'):
+                    constraints, variables = build_model(instance, l, rotation, False, encoding, kind, deadline)
+                with phases('setup'):
+                    s = get_solver(custom_search)
+                    s.add(constraints)
+                deadline.check()
+            except Expired:
+                print(f'TIMEOUT WHILE BUILDING THE MODEL WITH L = {l}')
+                return 'unknown', None, None
+            s.set(timeout=deadline.remaining())
+            with phases('solve'):
+                status = str(s.check())
+            model = s.model() if status == 'sat' else None
+        if status == 'sat':
+            with phases('decode'):
+                return (status, *decode(instance, l, variables, model, rotation, kind))
+        return status, None, None
+
+    result = search_length(probe, instance['minl'], instance['maxl'], search, deadline,
+                           checked(callback, instance, rotation))
+    instance['phases'] = phases.times
+    instance['search'] = search
+    instance['probes'] = result['probes']
+
+    if result['optimal']:
+        print('FOUND OPTIMAL SOLUTION')
+        instance['solved'] = True
+        instance['l'] = result['l']
+        instance.update(result['solution'])
+        instance['fulltime'] = str(phases)
+        instance['time'] = deadline.elapsed()
+    elif result['timeout']:
+        print('TIMEOUT')
+        report_best(instance, dict(result['solution'], l=result['l']) if result['solution'] is not None else None,
+                    result['lower_bound'], rotation, deadline, str(phases))
+    else:
+        print('UNSOLVABLE')
+    if cache is not None:
+        record(instance, rotation, cache)
     return instance
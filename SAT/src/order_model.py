@@ -0,0 +1,126 @@
+from z3 import *
+
+
+# order encoding of the coordinates (Soh et al., 2010): px[i][e] is true iff xhat_i <= e and py[i][f] is true
+# iff yhat_i <= f, while lr[i][j] (ud[i][j]) tells that circuit i is left of (below) circuit j.
+# The model has O(n * (w + l)) order variables and O(n^2 * (w + l)) clauses, instead of the O(w * l * n)
+# board of base_model.
+
+def le(p, e):
+    # literal for coordinate <= e, given its order variables p
+    if e < 0:
+        return BoolVal(False)
+    if e >= len(p) - 1:
+        return BoolVal(True)
+    return p[e]
+
+
+def orientations(instance, k, rotation, rot):
+    # (condition, width, height) of each orientation of circuit k
+    x, y = instance['inputx'][k], instance['inputy'][k]
+    if rotation and x != y:
+        return [(Not(rot[k]), x, y), (rot[k], y, x)]
+    return [(BoolVal(True), x, y)]
+
+
+def order_model(instance, l, rotation, incremental=False, deadline=None):
+    # with incremental=True, rows get activation literals as in base_model (see length_assumptions), with a deadline
+    # Expired is raised once it is over
+    constraints = []
+    vs = {}
+    circuits = list(range(instance['n']))
+    w = instance['w']
+
+    px = [[Bool(f'px_{i}_{e}') for e in range(w)] for i in circuits]
+    py = [[Bool(f'py_{i}_{f}') for f in range(l)] for i in circuits]
+    lr = [[Bool(f'lr_{i}_{j}') if i != j else None for j in circuits] for i in circuits]
+    ud = [[Bool(f'ud_{i}_{j}') if i != j else None for j in circuits] for i in circuits]
+    rot = [Bool(f'rot_{i}') for i in circuits]
+    vs['px'], vs['py'], vs['rot'] = px, py, rot
+
+    # order axioms
+    for i in circuits:
+        constraints += [Implies(px[i][e], px[i][e + 1]) for e in range(w - 1)]
+        constraints += [Implies(py[i][f], py[i][f + 1]) for f in range(l - 1)]
+
+    # circuits lie inside the plate
+    for i in circuits:
+        for cond, x, y in orientations(instance, i, rotation, rot):
+            if x > w or y > l:
+                constraints.append(Not(cond))
+            else:
+                constraints.append(Implies(cond, And(le(px[i], w - x), le(py[i], l - y))))
+        if not rotation or instance['inputx'][i] == instance['inputy'][i]:
+            constraints.append(Not(rot[i]))
+
+    # the plate is not fully covered, so the area argument is not implied by the other constraints
+    min_rows = -(-sum(x * y for x, y in zip(instance['inputx'], instance['inputy'])) // w)
+    if min_rows > l:
+        constraints.append(BoolVal(False))
+
+    if incremental:
+        rows = [Bool(f'R_{r}') for r in range(l)]
+        vs['R'] = rows
+        constraints += [Implies(rows[r + 1], rows[r]) for r in range(l - 1)]
+        constraints += [rows[r] for r in range(min(min_rows, l))]
+        # when row r is inactive every circuit ends at or below it
+        constraints += [Implies(And(Not(rows[r]), cond), le(py[i], r - y))
+                        for r in range(l) for i in circuits
+                        for cond, x, y in orientations(instance, i, rotation, rot)]
+
+    # no overlap constraint
+    for i in circuits:
+        if deadline is not None:
+            deadline.check()
+        for j in circuits:
+            if i < j:
+                constraints.append(Or(lr[i][j], lr[j][i], ud[i][j], ud[j][i]))
+            if i == j:
+                continue
+            for cond, x, y in orientations(instance, i, rotation, rot):
+                # i left of j: xhat_i + x <= xhat_j, i.e. xhat_j <= e + x implies xhat_i <= e
+                constraints.append(Implies(And(cond, lr[i][j]), Not(le(px[j], x - 1))))
+                constraints += [Implies(And(cond, lr[i][j]), Implies(le(px[j], e + x), le(px[i], e)))
+                                for e in range(w - x)]
+                # i below j
+                constraints.append(Implies(And(cond, ud[i][j]), Not(le(py[j], y - 1))))
+                constraints += [Implies(And(cond, ud[i][j]), Implies(le(py[j], f + y), le(py[i], f)))
+                                for f in range(l - y)]
+
+    # symmetry breaking constraints
+    # circuits too large to sit side by side (or one above the other)
+    for i in circuits:
+        for j in circuits:
+            if i < j and not rotation:
+                if instance['inputx'][i] + instance['inputx'][j] > w:
+                    constraints += [Not(lr[i][j]), Not(lr[j][i])]
+                if instance['inputy'][i] + instance['inputy'][j] > l:
+                    constraints += [Not(ud[i][j]), Not(ud[j][i])]
+    # identical circuits symmetry: a copy is never left of the previous one, nor below it unless also to its right
+    groups = instance.get('groups', [])
+    for group in groups:
+        for i, j in zip(group, group[1:]):
+            constraints += [Not(lr[j][i]), Or(lr[i][j], Not(ud[j][i]))]
+    # the biggest circuit lies in the left half of the plate, unless it has copies (the two symmetries would clash)
+    if not rotation and not any(0 in group for group in groups):
+        constraints.append(le(px[0], (w - instance['inputx'][0]) // 2))
+
+    return constraints, vs
+
+
+def get_solution(model, vs, instance, rotation):
+    xs, ys, xhats, yhats = [], [], [], []
+    rotations = [] if rotation else None
+    for k in range(instance['n']):
+        # the coordinate is the number of order variables set to false
+        xhat = sum(not is_true(model.eval(p, model_completion=True)) for p in vs['px'][k][:-1])
+        yhat = sum(not is_true(model.eval(p, model_completion=True)) for p in vs['py'][k][:-1])
+        rotated = rotation and is_true(model.eval(vs['rot'][k], model_completion=True))
+        x, y = instance['inputx'][k], instance['inputy'][k]
+        xs.append(y if rotated else x)
+        ys.append(x if rotated else y)
+        xhats.append(xhat)
+        yhats.append(yhat)
+        if rotation:
+            rotations.append(rotated)
+    return xs, ys, xhats, yhats, rotations
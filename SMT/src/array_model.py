@@ -1,18 +1,23 @@
 from z3 import *
 
 
-def array_model(instance):
+def array_variables(instance):
+    # model variables by name
     vs = {}
+    vs['w'], vs['l'] = Ints('width length')
+    vs['X'], vs['Y'] = Array('X', IntSort(), IntSort()), Array('Y', IntSort(), IntSort())
+    vs['Xhat'], vs['Yhat'] = Array('Xhat', IntSort(), IntSort()), Array('Yhat', IntSort(), IntSort())
+    # circuit i is stored at index c_i of the arrays
+    vs['components'] = [Int(f'c_{i}') for i in range(instance['n'])]
+    return vs
+
+
+def array_model(instance):
     # define main problem variables and constraints
-    w, l = Ints('width length')
-    components = [Int(f'c_{i}') for i in range(instance['n'])]
-    X = Array('X', IntSort(), IntSort())
-    Y = Array('Y', IntSort(), IntSort())
-    Xhat = Array('Xhat', IntSort(), IntSort())
-    Yhat = Array('Yhat', IntSort(), IntSort())
-    vs['w'], vs['l'] = w, l
-    vs['X'], vs['Y'] = X, Y
-    vs['Xhat'], vs['Yhat'] = Xhat, Yhat
+    vs = array_variables(instance)
+    w, l = vs['w'], vs['l']
+    components = vs['components']
+    X, Y, Xhat, Yhat = vs['X'], vs['Y'], vs['Xhat'], vs['Yhat']
 
     constraints = [vs['w'] == instance["w"], vs['l'] >= instance['minl'], vs['l'] <= instance['maxl']]
     # force components idx to be between 0 and 0, and all different
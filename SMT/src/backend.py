@@ -0,0 +1,29 @@
+from utils.search import STRATEGIES
+
+# command line of the SMT technology (see BACKENDS in main.py), z3 is only imported once the arguments are parsed
+
+
+def add_arguments(parser):
+    parser.add_argument('--smt-model', type=str, help='SMT model to use (default: base)', default='base')
+    parser.add_argument('--model-cache', type=str, help='directory where generated SMT models are saved as SMT-LIB2 '
+                                                        'and loaded back by later runs (default: no cache)')
+    parser.add_argument('--search', type=str, help='length search strategy (default: optimize)', default='optimize')
+    parser.add_argument('-d', '--dual', dest="dual", action="store_true", help="add dual model", default=False)
+
+
+def get_params(args):
+    if args.smt_model not in ('base', 'array'):
+        raise ValueError(f'wrong smt model {args.smt_model}; supported ones are "base", "array"')
+    if args.search not in ('optimize', 'descent') and args.search not in STRATEGIES:
+        raise ValueError(f'wrong search strategy {args.search}; supported ones are optimize, descent, '
+                         f'{", ".join(STRATEGIES)}')
+    return {'dual': args.dual, 'kind': args.smt_model, 'search': args.search, 'model_cache': args.model_cache}
+
+
+def get_solver(args):
+    from SMT.src.launch import solve_SMT
+    return solve_SMT
+
+
+def timings_suffix(args):
+    return f'-{args.smt_model}{"-" + args.search if args.search != "optimize" else ""}'
@@ -30,31 +30,55 @@ def flatten(matrix):
     return [cell for row in matrix for cell in row]
 
 
+def index_sizes(sizes):
+    # circuits by each size they can take
+    index = {}
+    for k, ks in enumerate(sizes):
+        for size in ks:
+            index.setdefault(size, []).append(k)
+    return index
+
+
+def equal_pairs(sizes):
+    # pairs i < j of circuits whose sizes can be equal
+    return sorted({(i, j) for group in index_sizes(sizes).values() for i in group for j in group if i < j})
+
+
+def sum_triples(pairs, sizes):
+    # triples i < j < k, with (i, j) in pairs, such that size_i + size_j == size_k can hold
+    index = index_sizes(sizes)
+    return sorted({(i, j, k) for i, j in pairs for a in sizes[i] for b in sizes[j]
+                   for k in index.get(a + b, []) if k > j})
+
+
+def base_variables(instance, rotation):
+    # model variables by name
+    vs = {'w': IntVal(instance["w"]), 'l': Int('length')}
+    for k in range(instance['n']):
+        vs[f'xhat_{k}'], vs[f'yhat_{k}'] = Ints(f'xhat_{k} yhat_{k}')
+        if rotation:
+            vs[f'x_{k}'], vs[f'y_{k}'] = Ints(f'x_{k} y_{k}')
+            vs[f'rotation_{k}'] = Bool(f'rotation_{k}')
+        else:
+            vs[f'x_{k}'], vs[f'y_{k}'] = IntVal(instance['inputx'][k]), IntVal(instance['inputy'][k])
+    return vs
+
+
 def base_model(instance, dual, rotation):
-    vs = {}
     # define main problem variables and constraints
-    w = IntVal(instance["w"])
-    l = Int('length')
+    vs = base_variables(instance, rotation)
+    w, l = vs['w'], vs['l']
     circuits = list(range(instance['n']))
-    vs['w'], vs['l'] = w, l
     # basic problem constraints
     constraints = [vs['l'] >= instance['minl'], vs['l'] <= instance['maxl']]
 
     for k in circuits:
-        xhat_i, yhat_i = Ints(f'xhat_{k} yhat_{k}')
-        vs[f'xhat_{k}'], vs[f'yhat_{k}'] = xhat_i, yhat_i
-
+        xhat_i, yhat_i = vs[f'xhat_{k}'], vs[f'yhat_{k}']
+        x_i, y_i = vs[f'x_{k}'], vs[f'y_{k}']
         if rotation:
-            x_i, y_i = Ints(f'x_{k} y_{k}')
-            rotation_i = Bool(f'rotation_{k}')
-            vs[f'rotation_{k}'] = rotation_i
-            constraints.append(If(rotation_i,
+            constraints.append(If(vs[f'rotation_{k}'],
                                 And(y_i == (instance['inputx'][k]), x_i == (instance['inputy'][k])),
                                 And(y_i == (instance['inputy'][k]), x_i == (instance['inputx'][k]))))
-        else:
-            x_i = IntVal(instance['inputx'][k])
-            y_i = IntVal(instance['inputy'][k])
-        vs[f'x_{k}'], vs[f'y_{k}'] = x_i, y_i
 
         constraints.append(xhat_i >= 0)
         constraints.append(xhat_i < w)
@@ -97,24 +121,38 @@ def base_model(instance, dual, rotation):
         for i in circuits for j in circuits if i < j]
 
     # symmetry breaking
+    # only the constraints whose conditions on the sizes can hold are generated: the sizes are constants
+    # without rotation (and the conditions are left out), with rotation each side is one of the two input sides
+    xsizes = [{x, y} if rotation else {x} for x, y in zip(instance['inputx'], instance['inputy'])]
+    ysizes = [{x, y} if rotation else {y} for x, y in zip(instance['inputx'], instance['inputy'])]
+
+    def sizes(*conditions):
+        return list(conditions) if rotation else []
+
     # rows and columns symmetry
-    constraints += [Implies(And(vs[f'xhat_{i}'] == vs[f'xhat_{j}'], vs[f'x_{i}'] == vs[f'x_{j}']),
+    xpairs, ypairs = equal_pairs(xsizes), equal_pairs(ysizes)
+    constraints += [Implies(And(vs[f'xhat_{i}'] == vs[f'xhat_{j}'], *sizes(vs[f'x_{i}'] == vs[f'x_{j}'])),
                             vs[f'yhat_{i}'] <= vs[f'yhat_{j}'])
-                    for i in circuits for j in circuits if i < j]
+                    for i, j in xpairs]
 
-    constraints += [Implies(And(vs[f'yhat_{i}'] == vs[f'yhat_{j}'], vs[f'y_{i}'] == vs[f'y_{j}']),
+    constraints += [Implies(And(vs[f'yhat_{i}'] == vs[f'yhat_{j}'], *sizes(vs[f'y_{i}'] == vs[f'y_{j}'])),
                             vs[f'xhat_{i}'] <= vs[f'xhat_{j}'])
-                    for i in circuits for j in circuits if i < j]
+                    for i, j in ypairs]
     # three block symmetry
-    constraints += [Implies(And(vs[f'xhat_{i}'] == vs[f'xhat_{j}'], vs[f'x_{i}'] == vs[f'x_{j}'],
-                                vs[f'yhat_{i}'] == vs[f'yhat_{k}'], vs[f'y_{i}'] + vs[f'y_{j}'] == vs[f'y_{k}']),
+    constraints += [Implies(And(vs[f'xhat_{i}'] == vs[f'xhat_{j}'], vs[f'yhat_{i}'] == vs[f'yhat_{k}'],
+                                *sizes(vs[f'x_{i}'] == vs[f'x_{j}'], vs[f'y_{i}'] + vs[f'y_{j}'] == vs[f'y_{k}'])),
                             vs[f'xhat_{k}'] <= vs[f'xhat_{i}'])
-                    for i in circuits for j in circuits for k in circuits if i < j < k]
+                    for i, j, k in sum_triples(xpairs, ysizes)]
 
-    constraints += [Implies(And(vs[f'yhat_{i}'] == vs[f'yhat_{j}'], vs[f'y_{i}'] == vs[f'y_{j}'],
-                                vs[f'xhat_{i}'] == vs[f'xhat_{k}'], vs[f'x_{i}'] + vs[f'x_{j}'] == vs[f'x_{k}']),
+    constraints += [Implies(And(vs[f'yhat_{i}'] == vs[f'yhat_{j}'], vs[f'xhat_{i}'] == vs[f'xhat_{k}'],
+                                *sizes(vs[f'y_{i}'] == vs[f'y_{j}'], vs[f'x_{i}'] + vs[f'x_{j}'] == vs[f'x_{k}'])),
                             vs[f'yhat_{k}'] <= vs[f'yhat_{i}'])
-                    for i in circuits for j in circuits for k in circuits if i < j < k]
+                    for i, j, k in sum_triples(ypairs, xsizes)]
+
+    # identical circuits symmetry
+    constraints += [Or(vs[f'yhat_{i}'] < vs[f'yhat_{j}'],
+                       And(vs[f'yhat_{i}'] == vs[f'yhat_{j}'], vs[f'xhat_{i}'] < vs[f'xhat_{j}']))
+                    for group in instance.get('groups', []) for i, j in zip(group, group[1:])]
 
     # force the biggest block to be always to the bottom left of the second biggest
     constraints.append(And(vs['xhat_0'] <= vs['xhat_1'], vs['yhat_0'] <= vs['yhat_1']))
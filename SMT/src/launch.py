@@ -1,53 +1,222 @@
+import hashlib
+import json
+import os
 from time import time
 from z3 import *
-from SMT.src.base_model import base_model
-from SMT.src.array_model import array_model
+from SMT.src.base_model import base_model, base_variables
+from SMT.src.array_model import array_model, array_variables
+from utils.cache import consult, evict, record
+from utils.deadline import Deadline, Phases
+from utils.search import checked, report_best, search_length
 
+MODEL_CACHE_SIZE = 2 ** 30  # bytes, least recently used compiled models are evicted above it
 
-def solve_SMT(instance, dual, rotation, kind='base', timeout=300000):
-    print(f'W = {instance["w"]}, N = {instance["n"]}')
-    opt = Optimize()
-    start_time = time()
+
+def get_solution(model, vs, instance, kind, rotation):
+    solution = {'rotation': None}
+    if kind == 'base':
+        solution['xhat'] = [model[vs[f'xhat_{i}']].as_long() for i in range(instance['n'])]
+        solution['yhat'] = [model[vs[f'yhat_{i}']].as_long() for i in range(instance['n'])]
+        if rotation:
+            solution['x'] = [model[vs[f'x_{i}']].as_long() for i in range(instance['n'])]
+            solution['y'] = [model[vs[f'y_{i}']].as_long() for i in range(instance['n'])]
+            solution['rotation'] = [is_true(model[vs[f'rotation_{i}']]) for i in range(instance['n'])]
+        else:
+            solution['x'] = instance['inputx']
+            solution['y'] = instance['inputy']
+    else:
+        # decoded back into the order of the input circuits
+        order = [model.eval(ci) for ci in vs['components']]
+        solution['x'] = [model.eval(vs['X'][i]).as_long() for i in order]
+        solution['y'] = [model.eval(vs['Y'][i]).as_long() for i in order]
+        solution['xhat'] = [model.eval(vs['Xhat'][i]).as_long() for i in order]
+        solution['yhat'] = [model.eval(vs['Yhat'][i]).as_long() for i in order]
+    # l is only an upper bound in the model, the actual height of the layout may be lower
+    solution['l'] = max(yhat + y for yhat, y in zip(solution['yhat'], solution['y']))
+    return solution
+
+
+def model_key(instance, dual, rotation, kind):
+    # everything the generated assertions depend on, the order of the circuits included
+    options = {'kind': kind, 'dual': bool(dual) and kind == 'base', 'rotation': bool(rotation) and kind == 'base',
+               'w': instance['w'], 'inputx': list(instance['inputx']), 'inputy': list(instance['inputy']),
+               'minl': instance['minl'], 'maxl': instance['maxl'], 'groups': instance.get('groups', [])}
+    return hashlib.sha256(json.dumps(options).encode()).hexdigest()
+
+
+def load_model(s, instance, dual, rotation, kind, phases, model_cache=None):
+    # adds the model to the solver s and returns its variables. With a model cache, the assertions generated
+    # by a previous run are read back from SMT-LIB2 instead of being built again in Python
     if kind == 'base':
-        constraints, vs = base_model(instance, dual, rotation)
+        vs = base_variables(instance, rotation)
     elif kind == 'array':
-        constraints, vs = array_model(instance)
+        vs = array_variables(instance)
     else:
         raise ValueError('wrong model parameter, implemented models are: base, array')
+    name = None
+    if model_cache is not None:
+        name = os.path.join(model_cache, f'{model_key(instance, dual, rotation, kind)}.smt2')
+        try:
+            with phases('setup'):
+                s.from_file(name)
+            os.utime(name)  # most recently used
+            print('LOADED COMPILED MODEL')
+            # z3 identifies variables by name, so the ones created above read the solutions of the loaded model
+            return vs
+        except (Z3Exception, FileNotFoundError):
+            pass
+
+    with phases('build'):
+        constraints, vs = base_model(instance, dual, rotation) if kind == 'base' else array_model(instance)
+    with phases('setup'):
+        s.add(constraints)
+    if name is not None:
+        os.makedirs(model_cache, exist_ok=True)
+        tmp = f'{name}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(s.sexpr())
+        os.replace(tmp, name)
+        evict(model_cache, MODEL_CACHE_SIZE, keep=name, suffix='.smt2')
+    return vs
+
+
+def set_hint(s, vs, instance, rotation):
+    # warm start: the solver tries the values of the hinted layout first. z3 versions without initial values (such
+    # as the pinned 4.8.12) only get the length of a complete hint, as upper bound of l
+    hint = instance['hint']
+    if not hasattr(s, 'set_initial_value'):
+        print('WARM START: THIS Z3 HAS NO INITIAL VALUES, ONLY THE HINTED LENGTH IS USED')
+        if 'l' in hint:
+            s.add(vs['l'] <= hint['l'])
+        return
+    for k, (xhat, yhat) in enumerate(zip(hint['xhat'], hint['yhat'])):
+        if xhat is not None:
+            s.set_initial_value(vs[f'xhat_{k}'], xhat)
+            s.set_initial_value(vs[f'yhat_{k}'], yhat)
+            if rotation:
+                s.set_initial_value(vs[f'rotation_{k}'], hint['rotation'][k])
+    if 'l' in hint:
+        s.set_initial_value(vs['l'], hint['l'])
+
 
-    setup_time = time() - start_time
-    opt.add(constraints)
-    opt.set(timeout=timeout)
-    opt.minimize(vs['l'])
-    solve_time = time() - start_time + setup_time
+def search_SMT(instance, s, vs, kind, rotation, search, deadline, phases, callback=None):
+    # plain solver probing l <= L for the lengths chosen by the search strategy
+    def probe(l, deadline):
+        s.set(timeout=deadline.remaining())
+        s.push()
+        s.add(vs['l'] <= l)
+        with phases('solve'):
+            status = str(s.check())
+        solution = None
+        if status == 'sat':
+            with phases('decode'):
+                solution = get_solution(s.model(), vs, instance, kind, rotation)
+        s.pop()
+        if solution is None:
+            return status, None, None
+        return status, solution['l'], solution
 
-    if str(opt.check()) == 'sat':
+    result = search_length(probe, instance['minl'], instance['maxl'], search, deadline, callback)
+    instance['probes'] = result['probes']
+    if result['optimal']:
+        return 'sat', result['solution'], result['l']
+    return 'unknown' if result['timeout'] else 'unsat', result['solution'], result['lower_bound']
+
+
+def descent_SMT(instance, s, vs, kind, rotation, deadline, phases, callback=None):
+    # plain solver asserting l <= best - 1 after each layout found, until unsat (the last layout is optimal)
+    # or the deadline. The bounds are never retracted, so everything the solver learns is kept between checks
+    probes, solutions = [], []
+    status, l = 'unknown', instance['maxl']
+    while l >= instance['minl']:
+        if deadline.expired():
+            status = 'unknown'
+            break
+        s.set(timeout=deadline.remaining())
+        probe_start = time()
+        with phases('solve'):
+            status = str(s.check())
+        probes.append({'l': l, 'status': status, 'time': time() - probe_start})
+        if status != 'sat':
+            break
+        with phases('decode'):
+            solutions.append(dict(get_solution(s.model(), vs, instance, kind, rotation), time=deadline.elapsed()))
+        print(f'SAT WITH L = {solutions[-1]["l"]}')
+        if callback is not None:
+            callback(solutions[-1])
+        l = solutions[-1]['l'] - 1
+        s.add(vs['l'] <= l)
+    else:
+        status = 'unsat'
+    instance['probes'] = probes
+    instance['solutions'] = solutions
+    best = solutions[-1] if solutions else None
+    if status == 'unsat' and best is not None:
+        return 'sat', best, best['l']
+    return status, best, instance['minl']
+
+
+def optimize_SMT(instance, s, vs, kind, rotation, deadline, phases, callback=None):
+    # z3 Optimize minimizing l, improving models are passed to callback as they are found (their decoding is
+    # counted as solving time, since it happens during the check)
+    if callback is not None:
+        s.set_on_model(lambda model: callback(dict(get_solution(model, vs, instance, kind, rotation),
+                                                   time=deadline.elapsed())))
+    s.set(timeout=deadline.remaining())
+    s.minimize(vs['l'])
+    with phases('solve'):
+        status = str(s.check())
+    solution = None
+    if status != 'unsat':
+        # after a timeout the model is the best one found so far, if any were found at all
+        try:
+            model = s.model()
+        except Z3Exception:
+            model = None
+        if model is not None and model[vs['l']] is not None:
+            with phases('decode'):
+                solution = get_solution(model, vs, instance, kind, rotation)
+    return status, solution, solution['l'] if status == 'sat' else instance['minl']
+
+
+def solve_SMT(instance, dual, rotation, kind='base', search='optimize', timeout=300000, cache=None,
+              model_cache=None, callback=None):
+    print(f'W = {instance["w"]}, N = {instance["n"]}')
+    if cache is not None and consult(instance, rotation, cache):
+        return instance
+    deadline = Deadline(timeout)
+    phases = Phases()
+    s = Optimize() if search == 'optimize' else Solver()
+    vs = load_model(s, instance, dual, rotation, kind, phases, model_cache)
+    if instance.get('hint') is not None and kind == 'base':
+        with phases('setup'):
+            set_hint(s, vs, instance, rotation)
+
+    instance['search'] = search
+    callback = checked(callback, instance, rotation)
+    if search == 'optimize':
+        status, solution, lower_bound = optimize_SMT(instance, s, vs, kind, rotation, deadline, phases, callback)
+    elif search == 'descent':
+        status, solution, lower_bound = descent_SMT(instance, s, vs, kind, rotation, deadline, phases, callback)
+    else:
+        status, solution, lower_bound = search_SMT(instance, s, vs, kind, rotation, search, deadline, phases,
+                                                   callback)
+    instance['phases'] = phases.times
+
+    if status == 'sat':
         print('FOUND OPTIMAL SOLUTION')
-        model = opt.model()
         instance['solved'] = True
-        instance['l'] = model[vs['l']].as_long()
-        if kind == 'base':
-            instance['xhat'] = [model[vs[f'xhat_{i}']].as_long() for i in range(instance['n'])]
-            instance['yhat'] = [model[vs[f'yhat_{i}']].as_long() for i in range(instance['n'])]
-            if rotation:
-                instance['x'] = [model[vs[f'x_{i}']].as_long() for i in range(instance['n'])]
-                instance['y'] = [model[vs[f'y_{i}']].as_long() for i in range(instance['n'])]
-                instance['rotation'] = [model[vs[f'rotation_{i}']] for i in range(instance['n'])]
-            else:
-                instance['x'] = instance['inputx']
-                instance['y'] = instance['inputy']
-        else:
-            instance['x'] = [model.eval(vs['X'][i]).as_long() for i in range(instance['n'])]
-            instance['y'] = [model.eval(vs['Y'][i]).as_long() for i in range(instance['n'])]
-            instance['xhat'] = [model.eval(vs['Xhat'][i]).as_long() for i in range(instance['n'])]
-            instance['yhat'] = [model.eval(vs['Yhat'][i]).as_long() for i in range(instance['n'])]
-        instance['fulltime'] = f'setup: {setup_time:.2f} s, solve: {solve_time:.2f} s'
-        instance['time'] = setup_time + solve_time
-    elif str(opt.check()) == 'unsat':
+        instance.update(solution)
+        instance['fulltime'] = str(phases)
+        instance['time'] = deadline.elapsed()
+    elif status == 'unsat':
         print('UNSOLVABLE')
         instance['solved'] = False
     else:
         print('TIMEOUT')
         instance['solved'] = False
-        instance['time'] = 300
+        instance['time'] = timeout / 1000
+        report_best(instance, solution, lower_bound, rotation, deadline, str(phases))
+    if cache is not None:
+        record(instance, rotation, cache)
     return instance
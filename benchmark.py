@@ -0,0 +1,187 @@
+import csv
+import json
+import os
+import resource
+import sys
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from itertools import product
+from multiprocessing import get_context
+from time import time
+from main import run_instance
+from utils.deadline import PHASES
+
+# benchmark harness: runs a matrix of configurations over a range of instances, each run in a fresh process so that
+# its peak memory is its own, and compares the results with a baseline (the json written by a previous run)
+
+MODELS = {'CP': ('base', 'dual'), 'SAT': ('base', 'order'), 'SMT': ('base', 'array')}
+FIELDS = ['config', 'technology', 'model', 'rotation', 'heuristic', 'restart', 'instance', 'status', 'l',
+          'lower_bound', 'optimal', 'time', *PHASES, 'peak_rss_mb', 'peak_rss_children_mb', 'error']
+
+
+def configurations(technologies, models, heuristics, restarts, rotations, solver='chuffed'):
+    # (name, technology, model, rotation, heuristic, restart, params) of each configuration of the matrix
+    for technology in technologies:
+        for model, rotation in product(models or MODELS[technology], rotations):
+            if model not in MODELS[technology]:
+                continue
+            name = f'{technology}-{model}{"-rot" if rotation else ""}'
+            if technology == 'CP':
+                if model == 'dual' and rotation:
+                    continue  # the rotation model has no dual
+                for heuristic, restart in product(heuristics, restarts):
+                    yield (f'{name}-heu{heuristic}-restart{restart}', technology, model, rotation, heuristic, restart,
+                           {'dual': model == 'dual', 'rotation': rotation, 'solver': solver,
+                            'search_heuristic': heuristic, 'restart_strategy': restart})
+            elif technology == 'SAT':
+                yield name, technology, model, rotation, None, None, {'rotation': rotation, 'kind': model}
+            else:
+                if model == 'array' and rotation:
+                    continue  # the array model does not support rotation
+                yield name, technology, model, rotation, None, None, {'dual': False, 'rotation': rotation,
+                                                                      'kind': model}
+
+
+def peak_rss():
+    # peak resident set size (MiB) of this process and of the solver processes it spawned (e.g. minizinc)
+    return {'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'peak_rss_children_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024}
+
+
+def read_optimal(directory):
+    # optimal lengths of the instances, known for the ones written by generate.py
+    name = os.path.join(directory, 'optimal.json')
+    if not os.path.isfile(name):
+        return {}
+    with open(name) as f:
+        return {int(i): l for i, l in json.load(f).items()}
+
+
+def run_benchmark(technology, params, i, timeout, verbose=False, directory='instances'):
+    # a single run, in its own process
+    if technology == 'CP':
+        from CP.src.launch import solve_CP as solver
+    elif technology == 'SAT':
+        from SAT.src.launch import solve_SAT as solver
+    else:
+        from SMT.src.launch import solve_SMT as solver
+    start = time()
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(sys.stdout if verbose else devnull):
+            _, instance = run_instance(solver, dict(params, timeout=timeout), i, True, directory=directory)
+    except Exception as e:
+        return dict(status='error', time=time() - start, error=repr(e), **peak_rss())
+    elapsed = time() - start
+    best = instance if instance['solved'] else instance.get('heuristic')
+    return dict(status='optimal' if instance['solved'] else 'timeout', l=best['l'] if best is not None else None,
+                lower_bound=instance['l'] if instance['solved'] else instance.get('lower_bound', instance['minl']),
+                time=elapsed, **instance.get('phases', {}), **peak_rss())
+
+
+def run_matrix(matrix, instances, timeout, jobs=1, verbose=False, directory='instances'):
+    # one process per run, the runs of the same configuration are kept together in the results
+    rows = []
+    optimal = read_optimal(directory)
+    with get_context('spawn').Pool(jobs, maxtasksperchild=1) as pool:
+        futures = [(config, i, pool.apply_async(run_benchmark, (config[1], config[6], i, timeout, verbose, directory)))
+                   for config in matrix for i in instances]
+        for (name, technology, model, rotation, heuristic, restart, _), i, future in futures:
+            row = dict(config=name, technology=technology, model=model, rotation=rotation, heuristic=heuristic,
+                       restart=restart, instance=i, optimal=optimal.get(i), **future.get())
+            if row['status'] == 'optimal' and row['optimal'] is not None and row['l'] != row['optimal']:
+                row['status'] = 'wrong'
+            print(f'{name} INSTANCE {i}: {row["status"].upper()}, L = {row.get("l")}, TIME = {row["time"]:.2f} s, '
+                  f'PEAK RSS = {row["peak_rss_mb"]:.0f} MiB')
+            rows.append(row)
+    return rows
+
+
+def save_results(name, rows, timeout):
+    os.makedirs(os.path.dirname(name) or '.', exist_ok=True)
+    with open(f'{name}.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, restval='')
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(f'{name}.json', 'w') as f:
+        json.dump({'timeout': timeout, 'runs': rows}, f, indent=1)
+
+
+def compare(rows, baseline, tolerance=0.2, min_delta=1.):
+    # a run regresses if it no longer proves the optimum, finds a longer layout or is slower than the baseline
+    # by more than tolerance (relative) and min_delta seconds (absolute, so that the noise of short runs is ignored)
+    previous = {(row['config'], row['instance']): row for row in baseline}
+    regressions = []
+    for row in rows:
+        old = previous.get((row['config'], row['instance']))
+        if old is None or old['status'] == 'error':
+            continue
+        if old['status'] == 'optimal' and row['status'] != 'optimal':
+            reason = f'{old["status"]} -> {row["status"]}'
+        elif old['l'] is not None and (row.get('l') is None or row['l'] > old['l']):
+            reason = f'L {old["l"]} -> {row.get("l")}'
+        elif row['status'] == 'optimal' and row['time'] > old['time'] * (1 + tolerance) + min_delta:
+            reason = f'time {old["time"]:.2f} s -> {row["time"]:.2f} s'
+        else:
+            continue
+        regressions.append((row['config'], row['instance'], reason))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('technologies', type=str, nargs='+', help='The technologies to benchmark (CP, SAT, SMT)')
+    parser.add_argument('-s', '--start', type=int, help='First instance to solve', default=1)
+    parser.add_argument('-e', '--end', type=int, help='Last instance to solve', default=40)
+    parser.add_argument('-i', '--instances', type=str, help='directory of the instances (default: instances)',
+                        default='instances')
+    parser.add_argument('-t', '--timeout', type=int, help='Timeout of each run (ms)', default=300000)
+    parser.add_argument('-j', '--jobs', type=int, help='Number of runs in parallel (default: 1, parallel runs '
+                                                       'compete for the cpu and skew the timings)', default=1)
+    parser.add_argument('-v', '--verbose', action='store_true', help='show the output of the solvers')
+    parser.add_argument('--models', type=str, nargs='+', help='models to benchmark (default: all the models of '
+                                                              'each technology)')
+    parser.add_argument('--heu', type=int, nargs='+', help='CP search heuristics (default: 0)', default=[0])
+    parser.add_argument('--restart', type=int, nargs='+', help='CP restart strategies (default: 1)', default=[1])
+    parser.add_argument('--solver', type=str, help='CP solver (default: chuffed)', default='chuffed')
+    parser.add_argument('--rotation', type=str, help='circuits rotation: off, on or both (default: off)',
+                        default='off')
+    parser.add_argument('-o', '--output', type=str, help='results are written to OUTPUT.csv and OUTPUT.json '
+                                                         '(default: benchmarks/results)', default='benchmarks/results')
+    parser.add_argument('--baseline', type=str, help='json results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, help='relative slowdown flagged as regression (default: 0.2)',
+                        default=0.2)
+    parser.add_argument('--min-delta', type=float, help='absolute slowdown (s) below which a run never regresses '
+                                                        '(default: 1)', default=1.)
+
+    args = parser.parse_args()
+    technologies = [technology.upper() for technology in args.technologies]
+    for technology in technologies:
+        if technology not in MODELS:
+            raise ValueError(f'wrong technology {technology}; supported ones are {", ".join(MODELS)}')
+    for model in args.models or []:
+        if not any(model in models for models in MODELS.values()):
+            raise ValueError(f'wrong model {model}; supported ones are base, dual, order, array')
+    if args.rotation not in ('off', 'on', 'both'):
+        raise ValueError(f'wrong rotation {args.rotation}; supported ones are off, on, both')
+    rotations = {'off': [False], 'on': [True], 'both': [False, True]}[args.rotation]
+    matrix = list(configurations(technologies, args.models, args.heu, args.restart, rotations, args.solver))
+
+    print('*' * 42)
+    print(f'BENCHMARKING {len(matrix)} CONFIGURATIONS ON INSTANCES {args.start} - {args.end}')
+    print('*' * 42)
+    rows = run_matrix(matrix, list(range(args.start, args.end + 1)), args.timeout, args.jobs, args.verbose,
+                      args.instances)
+    save_results(args.output, rows, args.timeout)
+    print(f'RESULTS SAVED TO {args.output}.csv, {args.output}.json')
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['timeout'] != args.timeout:
+            print(f'WARNING: THE BASELINE TIMEOUT IS {baseline["timeout"]} MS')
+        regressions = compare(rows, baseline['runs'], args.tolerance, args.min_delta)
+        for name, i, reason in regressions:
+            print(f'REGRESSION {name} INSTANCE {i}: {reason}')
+        print(f'{len(regressions)} REGRESSIONS')
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,113 @@
+import json
+import os
+from argparse import ArgumentParser
+import numpy as np
+from main import group_identical
+
+# synthetic instances: a plate of width w and length l is cut into n circuits by guillotine cuts, so the circuits
+# cover it exactly and l (the area bound) is their optimal length by construction. Instances are written in the
+# format of instances/ins-i.txt, their optimal lengths to optimal.json in the same directory
+
+DISTRIBUTIONS = ('uniform', 'random', 'skewed')
+
+
+def pick(pieces, distribution, rng):
+    # index of the next piece to cut, among the ones with a side of at least 2
+    areas = np.array([x * y if max(x, y) > 1 else 0 for x, y in pieces], dtype=float)
+    if not areas.any():
+        return None
+    if distribution == 'uniform':
+        # always the largest piece: circuits of similar sizes
+        return int(areas.argmax())
+    # random: pieces are cut proportionally to their area. skewed: every piece is as likely to be cut, so that small
+    # pieces keep being cut while some large ones are left alone, a few large circuits among many small ones
+    weights = (areas > 0).astype(float) if distribution == 'skewed' else areas
+    return int(rng.choice(len(pieces), p=weights / weights.sum()))
+
+
+def cut(piece, rng, half=False):
+    # splits a piece along one of its sides, in two identical halves if half is set
+    x, y = piece
+    sides = [side for side, size in enumerate(piece) if (size % 2 == 0 if half else size > 1)]
+    side = sides[rng.integers(len(sides))]
+    size = piece[side]
+    at = size // 2 if half else int(rng.integers(1, size))
+    return ((at, y), (x - at, y)) if side == 0 else ((x, at), (x, y - at))
+
+
+def generate(w, l, n, distribution='random', duplicates=0., rng=None):
+    # returns the sizes of n circuits covering a w x l plate, about duplicates * n of them copies of another circuit
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f'wrong distribution {distribution}; supported ones are {", ".join(DISTRIBUTIONS)}')
+    if not 0 <= duplicates < 1:
+        raise ValueError(f'wrong duplicate ratio {duplicates}; it must be in [0, 1)')
+    if w * l < n:
+        raise ValueError(f'a {w}x{l} plate cannot be cut into {n} circuits')
+    rng = np.random.default_rng() if rng is None else rng
+    copies = round(duplicates * n)
+    pieces = [(w, l)]
+    while len(pieces) < n - copies:
+        k = pick(pieces, distribution, rng)
+        pieces[k:k + 1] = cut(pieces[k], rng)
+    # each copy halves a piece with an even side, the halves are never cut again so that they stay identical
+    halves = []
+    while len(pieces) + len(halves) < n:
+        candidates = [k for k, (x, y) in enumerate(pieces) if x % 2 == 0 or y % 2 == 0]
+        if candidates:
+            halves += cut(pieces.pop(candidates[rng.integers(len(candidates))]), rng, half=True)
+        else:
+            # no piece left to halve, the remaining circuits come from plain cuts
+            k = pick(pieces, distribution, rng)
+            if k is None:
+                k = pick(halves, distribution, rng)
+                halves[k:k + 1] = cut(halves[k], rng)
+            else:
+                pieces[k:k + 1] = cut(pieces[k], rng)
+    circuits = pieces + halves
+    return [circuits[k] for k in rng.permutation(n)]
+
+
+def write_instance(name, w, circuits):
+    with open(name, 'w') as f:
+        f.write(f'{w}\n{len(circuits)}\n' + '\n'.join(f'{x} {y}' for x, y in circuits) + '\n')
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('output', type=str, help='directory of the generated instances')
+    parser.add_argument('-w', '--width', type=int, help='plate width', required=True)
+    parser.add_argument('-l', '--length', type=int, help='plate length, i.e. the optimal length (default: as many '
+                                                         'rows as needed for circuits of about 4x4 on average)')
+    parser.add_argument('-n', '--circuits', type=int, nargs='+', help='number of circuits, one instance (per '
+                                                                      'count) for each value', required=True)
+    parser.add_argument('-c', '--count', type=int, help='instances generated for each number of circuits '
+                                                        '(default: 1)', default=1)
+    parser.add_argument('-s', '--start', type=int, help='number of the first instance (default: 1)', default=1)
+    parser.add_argument('--distribution', type=str, help=f'circuit sizes: {", ".join(DISTRIBUTIONS)} '
+                                                         f'(default: random)', default='random')
+    parser.add_argument('--duplicates', type=float, help='fraction of circuits which are copies of another one '
+                                                         '(default: 0)', default=0.)
+    parser.add_argument('--seed', type=int, help='random seed')
+
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    os.makedirs(args.output, exist_ok=True)
+    optimal_name = os.path.join(args.output, 'optimal.json')
+    optimal = {}
+    if os.path.isfile(optimal_name):
+        with open(optimal_name) as f:
+            optimal = json.load(f)
+
+    i = args.start
+    for n in args.circuits:
+        l = args.length or max(-(-16 * n // args.width), 1)
+        for _ in range(args.count):
+            circuits = generate(args.width, l, n, args.distribution, args.duplicates, rng)
+            write_instance(os.path.join(args.output, f'ins-{i}.txt'), args.width, circuits)
+            optimal[str(i)] = l
+            # the groups also count the circuits which happen to be cut with the same size, as the models see them
+            print(f'INSTANCE {i}: W = {args.width}, N = {n}, L = {l}, {round(args.duplicates * n)} COPIES REQUESTED, '
+                  f'{len(group_identical(*zip(*circuits)))} GROUPS OF IDENTICAL CIRCUITS')
+            i += 1
+    with open(optimal_name, 'w') as f:
+        json.dump(optimal, f, indent=1)
@@ -1,51 +1,50 @@
 import json
 import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
 import numpy as np
 from argparse import ArgumentParser
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-from CP.src.launch import solve_CP
-from SAT.src.launch import solve_SAT
-from SMT.src.launch import solve_SMT
-
-
-def plot_board(width, height, blocks, args, i, rotation, show_plot=False, show_axis=False):
-    cmap = plt.cm.get_cmap('nipy_spectral', len(blocks))
-    fig, ax = plt.subplots(figsize=(10, 10))
-    for component, (w, h, x, y) in enumerate(blocks):
-        label = f'{w}x{h}, ({x},{y})'
-        if rotation is not None:
-            label += f', R={1 if rotation[component] else 0}'
-        ax.add_patch(Rectangle((x, y), w, h, facecolor=cmap(component), edgecolor='k', label=label, lw=2, alpha=0.8))
-    ax.set_ylim(0, height)
-    ax.set_xlim(0, width)
-    ax.set_xlabel('width', fontsize=15)
-    ax.set_ylabel('length', fontsize=15)
-    ax.legend()
-    ax.set_title(f'Instance {i}, size (WxH): {width}x{height}', fontsize=22)
-    if not show_axis:
-        ax.set_xticks([])
-        ax.set_yticks([])
-    plt.savefig(f'{args.technology}/out/fig-ins-{i}.png')
-    if show_plot:
-        plt.show(block=False)
-        plt.pause(1)
-    plt.close(fig)
-
-
-def get_timings(args):
+from importlib import import_module
+from utils.bounds import lower_bound
+from utils.deadline import Budget
+from utils.journal import LEASE_TIMEOUT, Journal
+from utils.output import PLOTS, Output, layout_text
+from utils.packer import greedy_pack
+from utils.warm_start import load_hint
+
+# each technology registers its command line arguments (add_arguments), their validation into solver parameters
+# (get_params), its solver (get_solver) and the suffix of its timings file (timings_suffix) in a backend module,
+# imported only when the technology is selected so that a run loads the solver stack it uses and nothing else
+BACKENDS = {'CP': 'CP.src.backend', 'SAT': 'SAT.src.backend', 'SMT': 'SMT.src.backend',
+            'PORTFOLIO': 'PORTFOLIO.src.backend'}
+
+
+def load_backend(technology):
+    if technology not in BACKENDS:
+        raise ValueError(f'wrong technology {technology}; supported ones are {", ".join(BACKENDS)}')
+    return import_module(BACKENDS[technology])
+
+
+def instance_set(args):
+    # name of the instance set, empty for the course instances
+    directory = os.path.normpath(args.instances)
+    return '' if directory == 'instances' else os.path.basename(directory)
+
+
+def output_dir(args):
+    # layouts of other instance sets are kept apart from the ones of the course instances, e.g. CP/out/synthetic
+    return f'{args.technology}/out' + (f'/{instance_set(args)}' if instance_set(args) else '')
+
+
+def get_timings(args, backend):
     if not os.path.exists('timings'):
         os.mkdir('timings')
     name = f'timings/{args.technology}{"-a" if args.area else ""}' \
-           f'{"-dual" if args.dual else ""}' \
-           f'{"-rot" if args.rotation else ""}'
-    if args.technology == 'CP':
-        name += f'-heu{args.heu}-restart{args.restart}'
-    elif args.technology == 'SAT':
-        name += f'{"-search" if args.sat_search else ""}'
-    elif args.technology == 'SMT':
-        name += f'-{args.smt_model}'
-    name += '.json'
+           f'{"-dual" if getattr(args, "dual", False) else ""}' \
+           f'{"-rot" if args.rotation else ""}' \
+           f'{"-cache" if args.cache else ""}' \
+           f'{"-" + instance_set(args) if instance_set(args) else ""}'
+    name += f'{backend.timings_suffix(args)}.json'
     if os.path.isfile(name):  # z3 I hate your timeout bug so much
         with open(name) as f:
             data = {int(k): v for k, v in json.load(f).items()}
@@ -54,99 +53,205 @@ def get_timings(args):
     return data, name
 
 
+def group_identical(x, y, rotation=False):
+    # indices of the circuits sharing the same size (up to rotation, if enabled), only groups of two or more.
+    # Copies of a circuit are interchangeable, so every model orders the copies of each group to avoid searching the
+    # layouts which only differ by a permutation of them
+    groups = {}
+    for k, dims in enumerate(zip(x, y)):
+        groups.setdefault(tuple(sorted(dims)) if rotation else dims, []).append(k)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def load_instance(i, area, rotation=False, verbose=False, directory='instances'):
+    with open(f'{directory}/ins-{i}.txt') as f:
+        lines = f.readlines()
+    if verbose:
+        print(''.join(lines))
+    lines = [l.strip('\n') for l in lines]
+    w = int(lines[0].strip('\n'))
+    n = int(lines[1].strip('\n'))
+    dim = [l.split(' ') for l in lines[2:]]
+    x, y = list(zip(*map(lambda xy: (int(xy[0]), int(xy[1])), dim)))
+    xy = np.array([x, y]).T
+    if area:
+        areas = np.prod(xy, axis=1)
+        # ties are broken by the circuit sizes, so that identical circuits end up next to each other
+        sorted_idx = np.lexsort((xy[:, 0], xy.min(axis=1), xy.max(axis=1), areas))[::-1]
+        xy = xy[sorted_idx]
+        x = list(map(int, xy[:, 0]))
+        y = list(map(int, xy[:, 1]))
+    minl, tight_bound, bounds = lower_bound(w, x, y, rotation)
+    if verbose:
+        print(f'LOWER BOUNDS: {bounds}')
+    print(f'MINL = {minl} ({tight_bound} bound)')
+    # the greedy packer gives a feasible layout, used both as upper bound and as fallback answer
+    heuristic = greedy_pack(w, x, y, rotation)
+    maxl = heuristic['l']
+    return {"w": w, 'n': n, 'inputx': x, 'inputy': y, 'minl': minl, 'maxl': maxl, 'rotation': None,
+            'heuristic': heuristic, 'minl_bound': tight_bound, 'groups': group_identical(x, y, rotation)}
+
+
+def print_improvement(solution):
+    # anytime mode: every improving layout is reported as soon as it is found
+    print(f'IMPROVED L = {solution["l"]} AFTER {solution["time"]:.2f} s')
+
+
+def run_instance(solver, params, i, area, verbose=False, warm_start=None, directory='instances'):
+    instance = load_instance(i, area, params['rotation'], verbose, directory)
+    hint = load_hint(warm_start, i, instance, params['rotation']) if warm_start is not None else None
+    if hint is not None:
+        placed = sum(xhat is not None for xhat in hint['xhat'])
+        print(f'WARM START WITH {placed}/{instance["n"]} CIRCUITS' + (f', L = {hint["l"]}' if 'l' in hint else ''))
+        instance['hint'] = hint
+        if 'l' in hint and hint['l'] < instance['maxl']:
+            # a complete hint is a feasible layout: it bounds the length and replaces the greedy fallback
+            instance['maxl'] = hint['l']
+            instance['heuristic'] = hint
+    return i, solver(instance, **params)
+
+
+def get_layout(instance):
+    # what the output stage needs to write the layout and its plot
+    return {key: instance[key] for key in ('w', 'l', 'n', 'x', 'y', 'xhat', 'yhat', 'rotation')}
+
+
+def instance_timeout(args, budget=None, journal=None):
+    # the timeout of the next instance, a share of the time left if there is a total budget
+    if budget is None:
+        return args.timeout
+    if journal is not None:
+        # the runners sharing the journal split the instances, the budget only has to cover the ones of this runner
+        budget.left = journal.claims(range(args.start, args.end + 1))
+    return budget.next_timeout()
+
+
+def get_result(instance, time):
+    # what the journal records about a solved (or timed out) instance
+    best = instance if instance['solved'] else instance.get('heuristic')
+    return {'solved': bool(instance['solved']), 'time': time, 'l': int(best['l']) if best is not None else None}
+
+
+def next_instance(instances, journal=None):
+    # the next instance to solve, leased from the journal if the run shares it with other runners
+    if journal is not None:
+        return journal.lease(instances)
+    return instances.pop(0) if instances else None
+
+
+def save_instance(args, i, instance, timings, timeout, output):
+    layout = None
+    if instance['solved']:
+        print(f'TIME: {instance["fulltime"]}')
+        timings[i] = instance['time']
+        layout = get_layout(instance)
+    else:
+        timings[i] = timeout / 1000
+        if instance.get('heuristic') is not None:
+            # not proven optimal, but the best layout known (greedy, cached or found before the timeout) is still valid
+            gap = f' (GAP {instance["gap"]})' if 'gap' in instance else ''
+            print(f'USING BEST KNOWN LAYOUT WITH L = {instance["heuristic"]["l"]}{gap}')
+            layout = get_layout(dict(instance, **instance['heuristic']))
+    if args.verbose and layout is not None:
+        print(layout_text(layout))
+    # with a journal, the instance is recorded as done once the output stage has written it
+    output.put(i, timings[i], layout, get_result(instance, timings[i]) if args.journal is not None else None)
+
+
 if __name__ == "__main__":
-    parser = ArgumentParser()
-    parser.add_argument('technology', type=str, help='The technology to use (CP, SAT or SMT)')
+    # the technology is parsed first, then the arguments of its backend are added to the parser
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('technology', type=str, nargs='?', help='The technology to use (CP, SAT, SMT or PORTFOLIO)')
     parser.add_argument('-s', '--start', type=int, help='First instance to solve', default=1)
     parser.add_argument('-e', '--end', type=int, help='Last instance to solve', default=40)
+    parser.add_argument('-i', '--instances', type=str, help='directory of the instances (default: instances), e.g. '
+                                                            'one written by generate.py', default='instances')
     parser.add_argument('-t', '--timeout', type=int, help='Timeout (ms)', default=300000)
+    parser.add_argument('-b', '--budget', type=int, help='total time budget (ms) shared by all the instances, '
+                                                         'each one gets at most TIMEOUT')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose')
     parser.add_argument('-a', '--no-area', dest="area", action="store_false", help="do not order circuits by area", default=True)
     parser.add_argument('-r', '--rotation', action="store_true", help="enables circuits rotation")
+    parser.add_argument('-j', '--jobs', type=int, help='Number of instances solved in parallel', default=1)
+    parser.add_argument('--anytime', action='store_true',
+                        help='report every improving layout as soon as it is found (CP, SAT and SMT)')
+    parser.add_argument('--warm-start', type=str, help='known layouts used as starting point (CP and SMT): "greedy" or '
+                                                       'a directory of out-i.txt files, e.g. CP/out')
+    parser.add_argument('--plots', type=str, help=f'plots of the layouts: {", ".join(PLOTS)} (default: png)',
+                        default='png')
+    parser.add_argument('--cache', type=str, help='directory of the solution cache shared between runs '
+                                                  '(default: no cache)')
+    parser.add_argument('--journal', type=str, help='directory of the job journal shared by the runners of a sweep '
+                                                    '(default: no journal)')
+    parser.add_argument('--lease-timeout', type=int, help=f'seconds without heartbeats after which a journal lease '
+                                                          f'is reclaimed (default: {LEASE_TIMEOUT})',
+                        default=LEASE_TIMEOUT)
 
-    # technology-specific arguments
-    parser.add_argument('--solver', type=str, help='CP solver (default: chuffed)', default='chuffed')
-    parser.add_argument('--heu', type=int, help='CP search heuristic (default: input_order, min)', default=0)
-    parser.add_argument('--restart', type=int, help='CP restart strategy (default: luby)', default=1)
-
-    parser.add_argument('--sat-search', action="store_true", help="enables custom z3 sat search")
-
-    parser.add_argument('--smt-model', type=str, help='SMT model to use (default: base)', default='base')
-    parser.add_argument('-d', '--dual', dest="dual", action="store_true", help="add dual model", default=False)
+    technology = parser.parse_known_args()[0].technology
+    backend = load_backend(technology.upper()) if technology is not None else None
+    if backend is not None:
+        backend.add_arguments(parser.add_argument_group(f'{technology.upper()} arguments'))
+    parser.add_argument('-h', '--help', action='help', help='show this help message (with the arguments of the '
+                                                            'technology, if given) and exit')
 
     args = parser.parse_args()
+    if backend is None:
+        parser.error('the following arguments are required: technology')
     args.technology = args.technology.upper()
-    params = {'rotation': args.rotation}
-    if args.technology == 'CP':
-        solver = solve_CP
-        if args.solver not in ('gecode', 'chuffed'):
-            raise ValueError(f'wrong solver {args.solver}; supported ones are gecode and chuffed')
-        if args.heu not in (0, 1, 2):
-            raise ValueError(f'wrong search heuristic {args.heu}; supported ones are (0, 1, 2)')
-        if args.restart not in (0, 1, 2):
-            raise ValueError(f'wrong restart {args.restart}; supported ones are (0, 1, 2)')
-        params.update({'solver': args.solver, 'search_heuristic': args.heu, 'restart_strategy': args.restart,
-                       'dual': args.dual})
-    elif args.technology == 'SAT':
-        solver = solve_SAT
-        params.update({'custom_search': args.sat_search})
-    elif args.technology == 'SMT':
-        solver = solve_SMT
-        if args.smt_model not in ('base', 'array'):
-            raise ValueError(f'wrong smt model {args.smt_model}; supported ones are "base", "array"')
-        params.update({'dual': args.dual, 'kind': args.smt_model})
-    else:
-        raise ValueError('Wrong technology, either CP, SAT or SMT')
+    params = {'rotation': args.rotation, 'cache': args.cache}
+    params.update(backend.get_params(args))
+    solver = backend.get_solver(args)
+    if args.anytime:
+        params['callback'] = print_improvement
 
-    if not os.path.exists(f'{args.technology}/out'):
-        os.mkdir(f'{args.technology}/out')
+    os.makedirs(output_dir(args), exist_ok=True)
     print('*' * 42)
     print(f'SOLVING INSTANCES {args.start} - {args.end} USING {args.technology} MODEL')
     print(f'PARAMETERS: {params}')
     print('*' * 42)
-    timings, timings_filename = get_timings(args)
-    for i in range(args.start, args.end + 1):
-        print('=' * 20)
-        print(f'INSTANCE {i}')
-        with open(f'instances/ins-{i}.txt') as f:
-            lines = f.readlines()
-        if args.verbose:
-            print(''.join(lines))
-        lines = [l.strip('\n') for l in lines]
-        w = int(lines[0].strip('\n'))
-        n = int(lines[1].strip('\n'))
-        dim = [l.split(' ') for l in lines[2:]]
-        x, y = list(zip(*map(lambda xy: (int(xy[0]), int(xy[1])), dim)))
-        xy = np.array([x, y]).T
-        if args.area:
-            areas = np.prod(xy, axis=1)
-            sorted_idx = np.argsort(areas)[::-1]
-            xy = xy[sorted_idx]
-            x = list(map(int, xy[:, 0]))
-            y = list(map(int, xy[:, 1]))
-        min_area = np.prod(xy, axis=1).sum()
-        minl = int(min_area / w)
-        xy[:, 0] = xy[:, 0].max()
-        oversized_area = np.prod(xy, axis=1).sum()
-        maxl = int(oversized_area / w)
-        instance = {"w": w, 'n': n, 'inputx': x, 'inputy': y, 'minl': minl, 'maxl': maxl, 'rotation': None}
-        instance = solver(instance, **params)
-        if instance['solved']:
-            out = f"{instance['w']} {instance['l']}\n{instance['n']}\n"
-            out += '\n'.join([f"{xi} {yi} {xhati} {yhati}"
-                              for xi, yi, xhati, yhati in zip(instance['x'], instance['y'],
-                                                              instance['xhat'], instance['yhat'])])
-            if args.verbose:
-                print(out)
-            print(f'TIME: {instance["fulltime"]}')
-            timings[i] = instance['time']
-            with open(f'{args.technology}/out/out-{i}.txt', 'w') as f:
-                f.write(out)
-            res = [(xi, yi, xhati, yhati)
-                   for xi, yi, xhati, yhati in zip(instance['x'], instance['y'], instance['xhat'], instance['yhat'])]
-            plot_board(instance['w'], instance['l'], res, args, i, instance['rotation'])
+    timings, timings_filename = get_timings(args, backend)
+    # with a journal, several runners (here or on other hosts) share the sweep and a killed run resumes where it
+    # stopped: every instance is leased before being solved and its result recorded once saved
+    config = os.path.basename(timings_filename)[:-len('.json')]
+    journal = Journal(args.journal, config, args.lease_timeout) if args.journal is not None else nullcontext()
+    with journal as journal, Output(output_dir(args), timings_filename, args.plots,
+                                    journal.complete if journal is not None else None) as output:
+        instances = list(range(args.start, args.end + 1))
+        budget = Budget(args.budget, len(instances), args.jobs, args.timeout) if args.budget is not None else None
+        if args.jobs > 1:
+            # instances are independent: each worker process loads and solves its own instance with its own solver,
+            # results are saved by the main process as soon as they come back. An instance is submitted when a worker
+            # is free, so that its timeout accounts for the budget used so far
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                running = {}
+                while True:
+                    while len(running) < args.jobs and (i := next_instance(instances, journal)) is not None:
+                        timeout = instance_timeout(args, budget, journal)
+                        future = pool.submit(run_instance, solver, dict(params, timeout=timeout), i,
+                                             args.area, args.verbose, args.warm_start, args.instances)
+                        running[future] = timeout
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        timeout = running.pop(future)
+                        i, instance = future.result()
+                        print('=' * 20)
+                        print(f'INSTANCE {i} DONE')
+                        save_instance(args, i, instance, timings, timeout, output)
+                        if budget is not None:
+                            budget.done()
         else:
-            timings[i] = 300.
-
-        with open(timings_filename, 'w') as f:
-            json.dump(timings, f)
+            while (i := next_instance(instances, journal)) is not None:
+                print('=' * 20)
+                print(f'INSTANCE {i}')
+                timeout = instance_timeout(args, budget, journal)
+                i, instance = run_instance(solver, dict(params, timeout=timeout), i, args.area, args.verbose,
+                                           args.warm_start, args.instances)
+                save_instance(args, i, instance, timings, timeout, output)
+                if budget is not None:
+                    budget.done()
+    # the journal is read once the output stage has recorded every written instance
+    if journal is not None:
+        counts = journal.status(range(args.start, args.end + 1))
+        print(f'JOURNAL: {", ".join(f"{count} {state.upper()}" for state, count in counts.items())}')
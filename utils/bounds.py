@@ -0,0 +1,57 @@
+import numpy as np
+
+
+def area_bound(w, xs, ys, rotation=False):
+    return int(-(-(xs * ys).sum() // w))
+
+
+def height_bound(w, xs, ys, rotation=False):
+    # the tallest circuit; with rotation each circuit can lie on its longest side, unless it would not fit in w
+    if rotation:
+        return int(np.where(np.maximum(xs, ys) > w, np.maximum(xs, ys), np.minimum(xs, ys)).max())
+    return int(ys.max())
+
+
+def width_conflict_bound(w, xs, ys, rotation=False):
+    # Martello, Monaci and Vigo (2003): circuits wider than w / 2 cannot sit side by side, so they are stacked;
+    # for each threshold p the circuits narrower than w - p but at least p wide can only fill the space left
+    # next to the ones wider than w / 2 (and not wider than w - p), the rest of their area goes on top
+    if rotation:
+        return 0
+    p = np.arange(1, w // 2 + 1)[:, None]
+    j1 = xs > w - p
+    j2 = (xs <= w - p) & (xs > w / 2)
+    j3 = (xs <= w / 2) & (xs >= p)
+    stacked = (ys * (j1 | j2)).sum(axis=1)
+    residual = (xs * ys * j3).sum(axis=1) - ((w - xs) * ys * j2).sum(axis=1)
+    return int((stacked + np.maximum(0, -(-residual // w))).max(initial=0))
+
+
+def dff_bound(w, xs, ys, rotation=False):
+    # dual feasible functions f map widths so that any set of circuits fitting side by side still has
+    # sum(f(x)) <= w, hence sum(y * f(x)) <= w * l; with rotation each circuit takes its cheapest orientation
+    def bound(f, scale=1):
+        cost = ys * f(xs)
+        if rotation:
+            cost = np.minimum(cost, np.where(ys <= w, xs * f(ys), cost))
+        return -(-cost.sum(axis=-1) // (w * scale))
+
+    bounds = [0]
+    for lam in range(1, w // 2 + 1):
+        # f_0 (Fekete and Schepers): small circuits are discarded, large ones take the whole width
+        bounds.append(bound(lambda x: np.where(x > w - lam, w, np.where(x >= lam, x, 0))))
+    for k in range(1, w + 1):
+        # u^(k) (Fekete and Schepers), scaled by k to stay integral
+        bounds.append(bound(lambda x: np.where((k + 1) * x % w == 0, k * x, (k + 1) * x // w * w), k))
+    return int(max(bounds))
+
+
+BOUNDS = {'area': area_bound, 'height': height_bound, 'width-conflict': width_conflict_bound, 'dff': dff_bound}
+
+
+def lower_bound(w, inputx, inputy, rotation=False):
+    # returns the best lower bound on the plate length, the name of the bound achieving it and all the bounds
+    xs, ys = np.array(inputx, dtype=np.int64), np.array(inputy, dtype=np.int64)
+    bounds = {name: bound(w, xs, ys, rotation) for name, bound in BOUNDS.items()}
+    tight = max(bounds, key=bounds.get)
+    return bounds[tight], tight, bounds
@@ -0,0 +1,142 @@
+import fcntl
+import hashlib
+import json
+import os
+from time import time
+from utils.search import valid_layout
+
+# on-disk cache of what is known about each instance: proven optimal layouts, lengths proven infeasible
+# (as a lower bound) and the best known layout (as an upper bound). Entries are keyed by the plate width and
+# the multiset of circuit sizes, so they are shared by every model and search configuration, and by
+# any ordering of the circuits. Each entry is a json file, written atomically under a lock on the cache directory.
+
+MAX_SIZE = 64 * 2 ** 20  # bytes, least recently used entries are evicted above it
+
+
+def canonical(x, y, rotation):
+    # with rotation a circuit and its rotated copy are the same circuit
+    return (min(x, y), max(x, y)) if rotation else (x, y)
+
+
+def fingerprint(instance, rotation):
+    dims = sorted(canonical(x, y, rotation) for x, y in zip(instance['inputx'], instance['inputy']))
+    key = json.dumps({'w': instance['w'], 'rotation': bool(rotation), 'circuits': dims})
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def entry_path(instance, rotation, path):
+    return os.path.join(path, f'{fingerprint(instance, rotation)}.json')
+
+
+def read_entry(name):
+    try:
+        with open(name) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def pack_layout(layout, instance):
+    # one [inputx, inputy, x, y, xhat, yhat] row per circuit, so that the layout does not depend on their order
+    return [list(map(int, row)) for row in zip(instance['inputx'], instance['inputy'],
+                                               layout['x'], layout['y'], layout['xhat'], layout['yhat'])]
+
+
+def unpack_layout(rows, instance, rotation):
+    # assigns the cached positions to the circuits of the instance, matching them by size
+    free = {}
+    for row in rows:
+        free.setdefault(canonical(row[0], row[1], rotation), []).append(row[2:])
+    layout = {'x': [], 'y': [], 'xhat': [], 'yhat': [], 'rotation': [] if rotation else None}
+    for inputx, inputy in zip(instance['inputx'], instance['inputy']):
+        x, y, xhat, yhat = free[canonical(inputx, inputy, rotation)].pop()
+        layout['x'].append(x)
+        layout['y'].append(y)
+        layout['xhat'].append(xhat)
+        layout['yhat'].append(yhat)
+        if rotation:
+            layout['rotation'].append((x, y) != (inputx, inputy))
+    layout['l'] = max(yhat + y for yhat, y in zip(layout['yhat'], layout['y']))
+    return layout
+
+
+def consult(instance, rotation, path):
+    # fills the instance and returns True if its optimum is cached, otherwise tightens minl and maxl
+    # with the cached bounds (the best cached layout replaces the greedy one) and returns False
+    start_time = time()
+    name = entry_path(instance, rotation, path)
+    entry = read_entry(name)
+    if entry is None:
+        return False
+    try:
+        os.utime(name)  # most recently used
+    except FileNotFoundError:
+        pass
+    best = unpack_layout(entry['layout'], instance, rotation) if entry['layout'] is not None else None
+    if best is not None and (entry['optimal'] or best['l'] <= max(entry['lower'], instance['minl'])):
+        print('FOUND CACHED OPTIMAL SOLUTION')
+        instance.update(best)
+        instance['solved'] = True
+        instance['cached'] = True
+        instance['time'] = time() - start_time
+        instance['fulltime'] = f'cached: {instance["time"]:.2f} s'
+        return True
+    instance['minl'] = max(instance['minl'], entry['lower'])
+    if best is not None and best['l'] < instance['maxl']:
+        instance['maxl'] = best['l']
+        instance['heuristic'] = best
+    print(f'CACHED BOUNDS: MINL = {instance["minl"]}, MAXL = {instance["maxl"]}')
+    return False
+
+
+def record(instance, rotation, path, max_size=MAX_SIZE):
+    # merges what the last run learnt about the instance into its cache entry
+    lower = instance['minl']
+    unsat = [probe['l'] for probe in instance.get('probes', []) if probe['status'] == 'unsat']
+    if unsat:
+        lower = max(lower, max(unsat) + 1)
+    # layouts are checked before being cached, an invalid one would be served to every later run
+    layouts = []
+    for layout in [instance.get('heuristic')] + ([instance] if instance.get('solved') else []):
+        if layout is None:
+            continue
+        if valid_layout(instance, layout, rotation):
+            layouts.append((layout['l'], pack_layout(layout, instance)))
+        else:
+            print(f'INVALID LAYOUT WITH L = {layout["l"]} NOT CACHED')
+    solved = bool(instance.get('solved')) and valid_layout(instance, instance, rotation)
+    if solved:
+        lower = instance['l']
+
+    os.makedirs(path, exist_ok=True)
+    name = entry_path(instance, rotation, path)
+    with open(os.path.join(path, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        entry = read_entry(name) or {'lower': 0, 'upper': None, 'layout': None, 'optimal': False}
+        entry['lower'] = max(entry['lower'], lower)
+        for l, layout in layouts:
+            if entry['upper'] is None or l < entry['upper']:
+                entry['upper'], entry['layout'] = l, layout
+        entry['optimal'] = entry['optimal'] or solved
+        tmp = f'{name}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, name)
+        evict(path, max_size, keep=name)
+
+
+def evict(path, max_size, keep=None, suffix='.json'):
+    # removes the least recently used entries (files ending with suffix) until the cache fits in max_size bytes
+    entries = []
+    for e in os.scandir(path):
+        if e.name.endswith(suffix) and e.path != keep:
+            entries.append((e.stat().st_mtime, e.stat().st_size, e.path))
+    size = sum(s for _, s, _ in entries) + (os.path.getsize(keep) if keep is not None else 0)
+    for _, s, name in sorted(entries):
+        if size <= max_size:
+            break
+        try:
+            os.remove(name)
+        except FileNotFoundError:  # already evicted by a concurrent run
+            pass
+        size -= s
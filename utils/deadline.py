@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+from time import time
+
+PHASES = ('build', 'setup', 'solve', 'decode')
+
+
+class Expired(Exception):
+    # raised by Deadline.check, e.g. to stop building a model which could not be solved in time anyway
+    pass
+
+
+class Deadline:
+    # wall-clock deadline of a solver run, started when the run starts so that model setup, search
+    # probes and solver calls all draw from the same timeout (ms)
+    def __init__(self, timeout):
+        self.start = time()
+        self.timeout = timeout
+
+    def elapsed(self):
+        return time() - self.start
+
+    def expired(self):
+        return self.elapsed() * 1000 >= self.timeout
+
+    def remaining(self):
+        # ms left, at least 1 since a zero timeout means no timeout to both z3 and minizinc
+        return max(self.timeout - int(self.elapsed() * 1000), 1)
+
+    def check(self):
+        if self.expired():
+            raise Expired()
+
+
+class Budget:
+    # total wall-clock budget (ms) of a run over several instances: each instance gets an equal share of the time
+    # left (times the number of instances solved in parallel), so the time saved on easy instances goes to the
+    # following ones. Each share is capped by the per instance timeout
+    def __init__(self, budget, instances, jobs=1, cap=None):
+        self.deadline = Deadline(budget)
+        self.left = instances
+        self.jobs = jobs
+        self.cap = cap
+
+    def next_timeout(self):
+        remaining = self.deadline.remaining()
+        share = min(remaining * self.jobs // max(self.left, 1), remaining)
+        return share if self.cap is None else min(share, self.cap)
+
+    def done(self):
+        self.left -= 1
+
+
+class Phases:
+    # wall-clock time (s) spent in each phase of a solver run: building the model in Python, handing it over to the
+    # solver (loading, flattening), solving and decoding the solutions. Phases must not be nested
+    def __init__(self):
+        self.times = dict.fromkeys(PHASES, 0.)
+
+    @contextmanager
+    def __call__(self, phase):
+        start = time()
+        try:
+            yield
+        finally:
+            self.times[phase] += time() - start
+
+    def move(self, source, target, seconds):
+        # for time measured as a whole but reported by the solver as two phases
+        seconds = min(seconds, self.times[source])
+        self.times[source] -= seconds
+        self.times[target] += seconds
+
+    def __str__(self):
+        return ', '.join(f'{phase}: {seconds:.2f} s' for phase, seconds in self.times.items())
@@ -0,0 +1,148 @@
+import fcntl
+import json
+import os
+import socket
+import threading
+from time import time
+from utils.cache import read_entry
+
+# job journal shared by the runners of a sweep, possibly on several hosts sharing the filesystem: a runner leases an
+# (instance, configuration) pair, keeps the lease alive with heartbeats while solving it and records its result.
+# Leases without heartbeats for lease_timeout seconds (or held by a dead process on the same host) are stale and can
+# be leased again, so a killed run resumes where it stopped. The journal is a json file, read and replaced atomically
+# under a lock on its directory; hosts need a filesystem supporting flock (e.g. NFSv4) and synchronized clocks
+
+LEASE_TIMEOUT = 60  # s
+MAX_ATTEMPTS = 3  # leases of a job, a job whose runners keep dying is given up
+
+
+def owner_alive(owner):
+    # only the processes of this host can be checked, the others are alive until their lease goes stale
+    host, pid = owner.rsplit(':', 1)
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Journal:
+    def __init__(self, path, config, lease_timeout=LEASE_TIMEOUT, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.config = config
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopped = threading.Event()
+        self.beater = threading.Thread(target=self.beat, daemon=True)
+
+    def key(self, i):
+        return f'{self.config}/{i}'
+
+    def live(self, job, now):
+        # whether the job is leased by a runner which is still working on it
+        return job['state'] == 'leased' and now - job['heartbeat'] < self.lease_timeout and owner_alive(job['owner'])
+
+    def update(self, change):
+        # applies change to the jobs under the lock and writes them back, returns what change returns
+        os.makedirs(self.path, exist_ok=True)
+        name = os.path.join(self.path, 'journal.json')
+        with open(os.path.join(self.path, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            jobs = read_entry(name) or {}
+            result = change(jobs)
+            tmp = f'{name}.{socket.gethostname()}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(jobs, f)
+            os.replace(tmp, name)
+        return result
+
+    def lease(self, instances):
+        # leases the first of the instances which is neither done, nor leased by a live runner, None if there is none
+        def take(jobs):
+            now = time()
+            for i in instances:
+                job = jobs.get(self.key(i), {'state': 'pending', 'attempts': 0})
+                if job['state'] == 'done' or self.live(job, now) or job['attempts'] >= self.max_attempts:
+                    continue
+                if job['state'] == 'leased':
+                    print(f'RECLAIMED STALE LEASE OF INSTANCE {i} FROM {job["owner"]}')
+                jobs[self.key(i)] = dict(job, state='leased', owner=self.owner, heartbeat=now,
+                                         attempts=job['attempts'] + 1)
+                return i
+            return None
+        return self.update(take)
+
+    def heartbeat(self):
+        # refreshes every lease of this runner
+        def refresh(jobs):
+            now = time()
+            for job in jobs.values():
+                if job['state'] == 'leased' and job['owner'] == self.owner:
+                    job['heartbeat'] = now
+        self.update(refresh)
+
+    def beat(self):
+        while not self.stopped.wait(self.lease_timeout / 6):
+            self.heartbeat()
+
+    def complete(self, i, result):
+        # records the result of instance i, unless another runner (which reclaimed the lease) recorded it first
+        def record(jobs):
+            job = jobs.get(self.key(i), {'attempts': 1})
+            if job.get('state') == 'done':
+                return False
+            jobs[self.key(i)] = dict(job, state='done', owner=self.owner, finished=time(), result=result)
+            return True
+        return self.update(record)
+
+    def release(self):
+        # gives back the leases of this runner (e.g. when interrupted), without counting them as attempts
+        def give_back(jobs):
+            for job in jobs.values():
+                if job['state'] == 'leased' and job['owner'] == self.owner:
+                    job.update(state='pending', attempts=job['attempts'] - 1)
+        self.update(give_back)
+
+    def claims(self, instances):
+        # the instances this runner can still expect to solve: the ones it holds, plus its share of the pending ones
+        # split evenly among the runners holding leases
+        jobs = read_entry(os.path.join(self.path, 'journal.json')) or {}
+        now = time()
+        owners, held, pending = {self.owner}, 0, 0
+        for i in instances:
+            job = jobs.get(self.key(i), {'state': 'pending', 'attempts': 0})
+            if self.live(job, now):
+                owners.add(job['owner'])
+                held += job['owner'] == self.owner
+            elif job['state'] != 'done' and job['attempts'] < self.max_attempts:
+                pending += 1
+        return held + -(-pending // len(owners))
+
+    def status(self, instances):
+        # number of instances in each state
+        jobs = read_entry(os.path.join(self.path, 'journal.json')) or {}
+        counts = {'done': 0, 'leased': 0, 'pending': 0, 'failed': 0}
+        now = time()
+        for i in instances:
+            job = jobs.get(self.key(i), {'state': 'pending', 'attempts': 0})
+            if job['state'] == 'done':
+                counts['done'] += 1
+            elif self.live(job, now):
+                counts['leased'] += 1
+            else:
+                counts['failed' if job['attempts'] >= self.max_attempts else 'pending'] += 1
+        return counts
+
+    def __enter__(self):
+        self.beater.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.beater.join()
+        self.release()
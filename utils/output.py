@@ -0,0 +1,175 @@
+import fcntl
+import json
+import os
+from colorsys import hsv_to_rgb
+from multiprocessing import Process, Queue
+from queue import Empty
+from threading import Thread
+
+# output stage: layouts, plots and timings are handed to a background process through a queue, so that solving never
+# waits on file output (nor on matplotlib). The worker writes in batches, everything queued since its last wake up,
+# and merges the timings of a batch into the timings file at once. Each written instance is acknowledged back, so that
+# what depends on its output being on disk (e.g. recording it as done in the journal) waits for it
+
+PLOTS = ('none', 'png', 'svg')
+LEGEND_SIZE = 50  # png plots of larger instances have no legend, which alone takes seconds to render
+
+
+def layout_text(layout):
+    # content of out-i.txt
+    out = f"{layout['w']} {layout['l']}\n{layout['n']}\n"
+    return out + '\n'.join(f"{xi} {yi} {xhati} {yhati}"
+                           for xi, yi, xhati, yhati in zip(layout['x'], layout['y'], layout['xhat'], layout['yhat']))
+
+
+def colour(k, n):
+    # n colours evenly spread over the hue circle
+    r, g, b = hsv_to_rgb(k / max(n, 1), 0.7, 0.9)
+    return f'#{int(r * 255):02x}{int(g * 255):02x}{int(b * 255):02x}'
+
+
+def label(k, layout):
+    text = f"{layout['x'][k]}x{layout['y'][k]}, ({layout['xhat'][k]},{layout['yhat'][k]})"
+    if layout['rotation'] is not None:
+        text += f", R={1 if layout['rotation'][k] else 0}"
+    return text
+
+
+def plot_png(name, i, layout, show_axis=False):
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Rectangle
+    n = layout['n']
+    cmap = plt.cm.get_cmap('nipy_spectral', n)
+    fig, ax = plt.subplots(figsize=(10, 10))
+    for k in range(n):
+        ax.add_patch(Rectangle((layout['xhat'][k], layout['yhat'][k]), layout['x'][k], layout['y'][k],
+                               facecolor=cmap(k), edgecolor='k', label=label(k, layout), lw=2, alpha=0.8))
+    ax.set_ylim(0, layout['l'])
+    ax.set_xlim(0, layout['w'])
+    ax.set_xlabel('width', fontsize=15)
+    ax.set_ylabel('length', fontsize=15)
+    if n <= LEGEND_SIZE:
+        ax.legend()
+    ax.set_title(f"Instance {i}, size (WxH): {layout['w']}x{layout['l']}", fontsize=22)
+    if not show_axis:
+        ax.set_xticks([])
+        ax.set_yticks([])
+    plt.savefig(name)
+    plt.close(fig)
+
+
+def plot_svg(name, i, layout, size=800):
+    # same picture as plot_png, written by hand: one rect per circuit with its label as tooltip. The y axis of svg
+    # points down, so circuits are placed from the bottom of the plate
+    w, l = layout['w'], layout['l']
+    scale = size / max(w, l)
+    title = 40
+    lines = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{w * scale:.0f}" height="{l * scale + title:.0f}">',
+             f'<text x="{w * scale / 2:.1f}" y="28" font-size="22" text-anchor="middle">'
+             f'Instance {i}, size (WxH): {w}x{l}</text>',
+             f'<g transform="translate(0,{title})">',
+             f'<rect width="{w * scale:.1f}" height="{l * scale:.1f}" fill="white" stroke="black"/>']
+    for k in range(layout['n']):
+        x, y = layout['x'][k] * scale, layout['y'][k] * scale
+        xhat, yhat = layout['xhat'][k] * scale, (l - layout['yhat'][k]) * scale - y
+        lines.append(f'<rect x="{xhat:.1f}" y="{yhat:.1f}" width="{x:.1f}" height="{y:.1f}" '
+                     f'fill="{colour(k, layout["n"])}" fill-opacity="0.8" stroke="black">'
+                     f'<title>{label(k, layout)}</title></rect>')
+    lines += ['</g>', '</svg>']
+    with open(name, 'w') as f:
+        f.write('\n'.join(lines))
+
+
+def save_timings(name, timings):
+    # merge the new timings into the file under an exclusive lock, so that concurrent runs sharing the same
+    # configuration do not overwrite each other, and replace it atomically
+    with open(f'{name}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.isfile(name):
+            with open(name) as f:
+                data = {int(k): v for k, v in json.load(f).items()}
+        else:
+            data = {}
+        data.update(timings)
+        tmp = f'{name}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, name)
+
+
+def write_batch(batch, directory, timings_name, plots):
+    # returns the items of the batch which were written
+    written = []
+    for item in batch:
+        i, _, layout, _ = item
+        if layout is not None:
+            try:
+                with open(f'{directory}/out-{i}.txt', 'w') as f:
+                    f.write(layout_text(layout))
+                if plots == 'png':
+                    plot_png(f'{directory}/fig-ins-{i}.png', i, layout)
+                elif plots == 'svg':
+                    plot_svg(f'{directory}/fig-ins-{i}.svg', i, layout)
+            except Exception as e:
+                print(f'OUTPUT OF INSTANCE {i} FAILED: {e!r}')
+                continue
+        written.append(item)
+    save_timings(timings_name, {i: time for i, time, _, _ in batch})
+    return written
+
+
+def drain(queue, acks, directory, timings_name, plots):
+    # worker loop, None marks the end of the run (and of the acknowledgements)
+    done = False
+    try:
+        while not done:
+            batch = [queue.get()]
+            while True:
+                try:
+                    batch.append(queue.get_nowait())
+                except Empty:
+                    break
+            done = None in batch
+            batch = [item for item in batch if item is not None]
+            if batch:
+                acks.put([(i, result) for i, _, _, result in write_batch(batch, directory, timings_name, plots)])
+    finally:
+        acks.put(None)
+
+
+class Output:
+    # the output stage of a run: put() returns immediately, close() (or leaving the with block) waits until
+    # everything is written. on_written(i, result), if given, is called (in a thread of this process) once the
+    # output of instance i is written
+    def __init__(self, directory, timings_name, plots='png', on_written=None):
+        if plots not in PLOTS:
+            raise ValueError(f'wrong plots {plots}; supported ones are {", ".join(PLOTS)}')
+        self.queue = Queue()
+        self.acks = Queue()
+        self.on_written = on_written
+        self.worker = Process(target=drain, args=(self.queue, self.acks, directory, timings_name, plots))
+        self.worker.start()
+        self.listener = Thread(target=self.listen, daemon=True)
+        self.listener.start()
+
+    def put(self, i, time, layout=None, result=None):
+        # time goes to the timings file, the layout (if any) to out-i.txt and to the plot, result is handed back
+        # to on_written
+        self.queue.put((i, time, layout, result))
+
+    def listen(self):
+        while (written := self.acks.get()) is not None:
+            for i, result in written:
+                if self.on_written is not None:
+                    self.on_written(i, result)
+
+    def close(self):
+        self.queue.put(None)
+        self.worker.join()
+        self.listener.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,53 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def skyline_pack(w, inputx, inputy, order, rotation=False):
+    # bottom-left skyline packing: circuits are placed one at a time, in the given order, at the position
+    # (and orientation, if rotation is allowed) that minimizes their top edge, ties broken by lowest then leftmost
+    n = len(inputx)
+    skyline = np.zeros(w, dtype=int)
+    xs, ys = np.array(inputx), np.array(inputy)
+    xhat, yhat = np.zeros(n, dtype=int), np.zeros(n, dtype=int)
+    rotated = np.zeros(n, dtype=bool)
+    for k in order:
+        best = None
+        orientations = [(xs[k], ys[k], False)]
+        if rotation and xs[k] != ys[k]:
+            orientations.append((ys[k], xs[k], True))
+        # orientations wider than the plate are skipped, as in bounds.height_bound
+        for cw, ch, rot in [orientation for orientation in orientations if orientation[0] <= w]:
+            # lowest y at which the circuit can sit for every x position, i.e. the sliding maximum of the skyline
+            bottoms = sliding_window_view(skyline, cw).max(axis=1)
+            x = int(np.lexsort((np.arange(len(bottoms)), bottoms, bottoms + ch))[0])
+            candidate = (bottoms[x] + ch, bottoms[x], x, cw, ch, rot)
+            if best is None or candidate[:3] < best[:3]:
+                best = candidate
+        top, bottom, x, cw, ch, rot = best
+        skyline[x:x + cw] = top
+        xhat[k], yhat[k], rotated[k] = x, bottom, rot
+    x_out = np.where(rotated, ys, xs)
+    y_out = np.where(rotated, xs, ys)
+    return {'l': int(skyline.max()), 'x': list(map(int, x_out)), 'y': list(map(int, y_out)),
+            'xhat': list(map(int, xhat)), 'yhat': list(map(int, yhat)),
+            'rotation': list(map(bool, rotated)) if rotation else None}
+
+
+def greedy_pack(w, inputx, inputy, rotation=False):
+    # returns the best layout found by the skyline packer over a few circuit orderings
+    xs, ys = np.array(inputx), np.array(inputy)
+    orders = [np.lexsort((-xs, -ys)),  # decreasing height
+              np.lexsort((-ys, -xs)),  # decreasing width
+              np.argsort(-xs * ys, kind='stable'),  # decreasing area
+              np.argsort(-np.maximum(xs, ys), kind='stable')]  # decreasing longest side
+    if (np.minimum(xs, ys) if rotation else xs).max() > w:
+        raise ValueError(f'a circuit is wider than the plate ({w}) in every orientation')
+    # greedy choices of orientation are not always better, so unrotated layouts are kept as candidates (when every
+    # circuit fits unrotated)
+    layouts = [skyline_pack(w, inputx, inputy, order) for order in orders] if xs.max() <= w else []
+    if rotation:
+        layouts += [skyline_pack(w, inputx, inputy, order, rotation) for order in orders]
+    best = min(layouts, key=lambda layout: layout['l'])
+    if rotation and best['rotation'] is None:
+        best['rotation'] = [False] * len(inputx)
+    return best
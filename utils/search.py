@@ -0,0 +1,116 @@
+from time import time
+import numpy as np
+from utils.deadline import Deadline
+
+
+# each strategy picks the next length to probe given the current bounds: every length below lo is
+# proven infeasible, hi is the height of the best layout found so far (None if no layout is known yet)
+
+def linear_up(lo, hi, maxl, probes):
+    return lo
+
+
+def linear_down(lo, hi, maxl, probes):
+    # maxl is always feasible, it is the height of the greedy layout
+    return maxl if hi is None else hi - 1
+
+
+def bisection(lo, hi, maxl, probes):
+    return (lo + (maxl if hi is None else hi - 1)) // 2
+
+
+def galloping(lo, hi, maxl, probes):
+    # exponentially growing steps from the lower bound until the first feasible length, then bisection
+    if hi is not None:
+        return bisection(lo, hi, maxl, probes)
+    unsat = sum(probe['status'] == 'unsat' for probe in probes)
+    return min(lo + 2 ** unsat - 1, maxl)
+
+
+STRATEGIES = {'linear-up': linear_up, 'linear-down': linear_down, 'bisection': bisection, 'galloping': galloping}
+
+
+def search_length(probe, minl, maxl, strategy='linear-up', deadline=None, callback=None):
+    # probe(l, deadline) checks whether the circuits fit in a plate of length l and returns a tuple
+    # (status, height, solution) where status is one of 'sat', 'unsat', 'unknown'.
+    # callback, if given, receives every improving layout as soon as it is found
+    if strategy not in STRATEGIES:
+        raise ValueError(f'wrong search strategy {strategy}; supported ones are {", ".join(STRATEGIES)}')
+    next_length = STRATEGIES[strategy]
+    deadline = Deadline(300000) if deadline is None else deadline
+    probes = []
+    lo, hi, best = minl, None, None
+    timed_out = False
+
+    while lo <= maxl and (hi is None or lo < hi):
+        if deadline.expired():
+            timed_out = True
+            break
+        l = next_length(lo, hi, maxl, probes)
+        probe_start = time()
+        status, height, solution = probe(l, deadline)
+        probes.append({'l': l, 'status': status, 'time': time() - probe_start})
+        if status == 'sat':
+            print(f'SAT WITH L = {l}')
+            if callback is not None and (hi is None or height < hi):
+                callback(dict(solution, l=height, time=deadline.elapsed()))
+            hi, best = height, solution
+        elif status == 'unsat':
+            print(f'UNSAT WITH L = {l}')
+            lo = l + 1
+        else:
+            timed_out = True
+            break
+
+    return {'l': hi, 'solution': best, 'lower_bound': lo, 'optimal': hi is not None and lo >= hi,
+            'timeout': timed_out, 'probes': probes}
+
+
+def valid_layout(instance, layout, rotation):
+    # whether the layout places every circuit of the instance with its size (or the rotated one, with rotation)
+    # inside a plate of width w and length layout['l'], without overlaps
+    xs, ys, xhats, yhats = (np.array(layout[key], dtype=int) for key in ('x', 'y', 'xhat', 'yhat'))
+    inputx, inputy = np.array(instance['inputx']), np.array(instance['inputy'])
+    if len(xs) != instance['n']:
+        return False
+    sizes = ((xs == inputx) & (ys == inputy)) | (rotation & (xs == inputy) & (ys == inputx))
+    if not sizes.all() or (xhats < 0).any() or (yhats < 0).any() or (xhats + xs > instance['w']).any() \
+            or (yhats + ys > layout['l']).any():
+        return False
+    board = np.zeros((layout['l'], instance['w']), dtype=bool)
+    for x, y, xhat, yhat in zip(xs, ys, xhats, yhats):
+        if board[yhat:yhat + y, xhat:xhat + x].any():
+            return False
+        board[yhat:yhat + y, xhat:xhat + x] = True
+    return True
+
+
+def checked(callback, instance, rotation):
+    # callback receiving only the valid layouts
+    if callback is None:
+        return None
+
+    def check(layout):
+        if valid_layout(instance, layout, rotation):
+            callback(layout)
+        else:
+            print(f'INVALID LAYOUT WITH L = {layout["l"]} IGNORED')
+    return check
+
+
+def report_best(instance, solution, lower_bound, rotation, deadline, fulltime):
+    # when the optimum is not proven, the best layout found is kept as fallback answer (if lower than the greedy
+    # one) together with its gap to the proven lower bound. With no gap the layout is optimal, so the instance is
+    # solved like when the solver proves it
+    if solution is not None and not valid_layout(instance, solution, rotation):
+        print(f'INVALID LAYOUT WITH L = {solution["l"]} IGNORED')
+        solution = None
+    if solution is not None and (instance.get('heuristic') is None or solution['l'] < instance['heuristic']['l']):
+        instance['heuristic'] = solution
+    if instance.get('heuristic') is not None:
+        instance['lower_bound'] = lower_bound
+        instance['gap'] = instance['heuristic']['l'] - lower_bound
+        print(f'BEST L = {instance["heuristic"]["l"]}, LOWER BOUND = {lower_bound}, GAP = {instance["gap"]}')
+        if instance['gap'] == 0:
+            print('BEST LAYOUT AT THE LOWER BOUND, OPTIMAL')
+            instance.update(instance['heuristic'], solved=True, time=deadline.elapsed(), fulltime=fulltime)
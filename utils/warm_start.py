@@ -0,0 +1,51 @@
+import os
+from utils.cache import canonical
+from utils.search import valid_layout
+
+# warm start hints: a known layout (the output of a previous run or the greedy one) mapped onto the circuits of
+# an instance. Circuits are matched by size, so the layout of a similar instance gives a partial hint where the
+# unmatched circuits are None
+
+
+def read_layout(name):
+    # parses an out-i.txt file written by main.py
+    with open(name) as f:
+        lines = [line.split() for line in f.read().splitlines() if line.strip()]
+    w, l = map(int, lines[0])
+    x, y, xhat, yhat = zip(*[map(int, line) for line in lines[2:2 + int(lines[1][0])]])
+    return {'w': w, 'l': l, 'x': list(x), 'y': list(y), 'xhat': list(xhat), 'yhat': list(yhat)}
+
+
+def match_layout(layout, instance, rotation):
+    free = {}
+    for placement in zip(layout['x'], layout['y'], layout['xhat'], layout['yhat']):
+        free.setdefault(canonical(placement[0], placement[1], rotation), []).append(placement)
+    hint = {'x': [], 'y': [], 'xhat': [], 'yhat': [], 'rotation': [] if rotation else None}
+    for inputx, inputy in zip(instance['inputx'], instance['inputy']):
+        placements = free.get(canonical(inputx, inputy, rotation))
+        x, y, xhat, yhat = placements.pop(0) if placements else (None, None, None, None)
+        for key, value in zip(('x', 'y', 'xhat', 'yhat'), (x, y, xhat, yhat)):
+            hint[key].append(value)
+        if rotation:
+            hint['rotation'].append(xhat is not None and (x, y) != (inputx, inputy))
+    return hint
+
+
+def load_hint(source, i, instance, rotation):
+    # source is either 'greedy' or a directory with the out-i.txt files of a previous run
+    if source == 'greedy':
+        layout = instance['heuristic']
+    else:
+        name = os.path.join(source, f'out-{i}.txt')
+        if not os.path.isfile(name):
+            return None
+        layout = read_layout(name)
+        if layout['w'] != instance['w']:
+            return None
+    hint = match_layout(layout, instance, rotation)
+    # a hint matching every circuit is a whole layout, and its length an upper bound if the layout is valid
+    if None not in hint['xhat']:
+        l = max(yhat + y for yhat, y in zip(hint['yhat'], hint['y']))
+        if valid_layout(instance, dict(hint, l=l), rotation):
+            hint['l'] = l
+    return hint